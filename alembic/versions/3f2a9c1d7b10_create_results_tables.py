@@ -0,0 +1,65 @@
+"""create results tables
+
+Baseline of the tables the pipeline created on demand before migrations;
+existing tables are left untouched.
+
+Revision ID: 3f2a9c1d7b10
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d7b10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "model_results" not in existing:
+        op.create_table(
+            "model_results",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("accuracy", sa.Float),
+            sa.Column("loss", sa.Float),
+            sa.Column("model_name", sa.String(255)),
+        )
+    if "cv_results" not in existing:
+        op.create_table(
+            "cv_results",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("run_id", sa.String(64)),
+            sa.Column("model_name", sa.String(255)),
+            sa.Column("fold", sa.Integer),
+            sa.Column("r2", sa.Float),
+            sa.Column("mse", sa.Float),
+            sa.Column("rmse", sa.Float),
+            sa.Column("mae", sa.Float),
+        )
+    if "prediction_logs" not in existing:
+        op.create_table(
+            "prediction_logs",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("endpoint", sa.String(32)),
+            sa.Column("run_id", sa.String(64)),
+            sa.Column("features", sa.Text),
+            sa.Column("predicted_quality", sa.Float),
+            sa.Column("latency_ms", sa.Float),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema.
+
+    A no-op: the tables may predate this baseline and hold results written before
+    migrations were introduced, so they are never dropped.
+    """
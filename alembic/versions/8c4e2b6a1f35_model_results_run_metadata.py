@@ -0,0 +1,62 @@
+"""model_results run metadata and indexes
+
+Adds the MLflow run id, a creation timestamp, the hyperparameters and the test
+metrics to model_results, indexed for latest/best-run lookups per model.
+
+Revision ID: 8c4e2b6a1f35
+Revises: 3f2a9c1d7b10
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2b6a1f35'
+down_revision: Union[str, None] = '3f2a9c1d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_model_results_run_id", ["run_id"]),
+    ("ix_model_results_created_at", ["created_at"]),
+    ("ix_model_results_model_name_created_at", ["model_name", "created_at"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables created by Database.ensure_table already have the new columns and indexes
+    inspector = sa.inspect(op.get_bind())
+    existing_columns = {column["name"] for column in inspector.get_columns("model_results")}
+    existing_indexes = {index["name"] for index in inspector.get_indexes("model_results")}
+
+    new_columns = [
+        sa.Column("run_id", sa.String(64)),
+        sa.Column("created_at", sa.DateTime, nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("hyperparameters", sa.Text),
+        sa.Column("mse", sa.Float),
+        sa.Column("rmse", sa.Float),
+        sa.Column("mae", sa.Float),
+        sa.Column("r2", sa.Float),
+    ]
+    with op.batch_alter_table("model_results") as batch_op:
+        for column in new_columns:
+            if column.name not in existing_columns:
+                batch_op.add_column(column)
+
+    for name, columns in INDEXES:
+        if name not in existing_indexes:
+            op.create_index(name, "model_results", columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name="model_results")
+    with op.batch_alter_table("model_results") as batch_op:
+        for column in ("r2", "mae", "rmse", "mse", "hyperparameters", "created_at", "run_id"):
+            batch_op.drop_column(column)
@@ -0,0 +1,183 @@
+"""
+Pipeline Benchmark.
+
+Times the preprocessing tasks (load_data, clean_data, feature_engineering),
+the feature building and model fit of train_model_pipeline and the /predict and /predict/batch
+endpoints on synthetic wine datasets of 10k, 1M and 10M rows. Results are
+written as JSON so runs on different commits can be compared.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--sizes 10k,1m,10m] [--output results.json]
+                                        [--max-train-rows 1000000] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from prefect import flow
+
+from benchmarks.synthetic import SIZES, write_wine_csv
+from src.data_preprocessing import clean_data, feature_engineering, load_data
+from src.train import fit_forest, new_feature_transform, prepare_training_sets
+from src.utils import load_config
+
+BATCH_SIZES = (64, 1024)
+
+
+def timed(fn, *args):
+    """Return (fn(*args), wall time in seconds)."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def latency_summary(timings: list) -> dict:
+    """Median, p99 and mean of request timings in milliseconds."""
+    timings = np.asarray(timings) * 1000.0
+    return {"p50_ms": float(np.percentile(timings, 50)), "p99_ms": float(np.percentile(timings, 99)),
+            "mean_ms": float(timings.mean())}
+
+
+@flow(name="Benchmark Preprocessing")
+def bench_preprocessing(raw_path: str, compact: bool = False):
+    # Prefect tasks log through the run context, so the task functions run inside a flow
+    df, load_seconds = timed(load_data.fn, raw_path, compact)
+    df, clean_seconds = timed(clean_data.fn, df)
+    df, feature_seconds = timed(feature_engineering.fn, df)
+    return df, {"load_data_s": load_seconds, "clean_data_s": clean_seconds,
+                "feature_engineering_s": feature_seconds}
+
+
+def bench_fit(df, config: dict, max_train_rows: int) -> tuple:
+    """
+    Build the features and fit the model with the helpers of train_model_pipeline, on at
+    most max_train_rows rows: same feature subset, standardization, dtypes and split.
+    """
+    model_config = config["model"]
+    if max_train_rows and len(df) > max_train_rows:
+        df = df.sample(n=max_train_rows, random_state=model_config["random_state"])
+    compact = config["data"].get("compact_dtypes", False)
+    transform = new_feature_transform(model_config, compact, [column for column in df.columns if column != "quality"])
+    df = df[transform.used_columns + ["quality"]]
+
+    (X_train, _, y_train, _, _), feature_seconds = timed(
+        prepare_training_sets, df, transform, model_config["test_size"], model_config["random_state"])
+    model, fit_seconds = timed(fit_forest, X_train, y_train, model_config["n_estimators"], model_config["random_state"])
+    return model, transform, {"train_rows": len(X_train), "build_features_s": feature_seconds, "fit_s": fit_seconds}
+
+
+def bench_api(model, transform, df, requests: int) -> dict:
+    """Time /predict and /predict/batch through an in-process test client serving the given model."""
+    from fastapi.testclient import TestClient
+    import src.deployment as deployment
+    from src.model_loader import LoadedModel
+
+    raw_columns = list(df.columns[:len(deployment.FEATURE_FIELDS)])
+    records = [dict(zip(deployment.FEATURE_FIELDS, row))
+               for row in df[raw_columns].head(max(BATCH_SIZES)).to_numpy().tolist()]
+
+    previous = deployment.get_active_model()
+    deployment.set_active_model(LoadedModel(model, "benchmark", "manual", transform=transform))
+    try:
+        client = TestClient(deployment.app)
+        results = {}
+        single = []
+        client.post("/predict", json=records[0])  # warm-up
+        for i in range(requests):
+            start = time.perf_counter()
+            client.post("/predict", json=records[i % len(records)]).raise_for_status()
+            single.append(time.perf_counter() - start)
+        results["predict_single"] = latency_summary(single)
+
+        for batch_size in BATCH_SIZES:
+            payload = {"records": records[:batch_size]}
+            batch = []
+            for _ in range(max(3, requests // 10)):
+                start = time.perf_counter()
+                client.post("/predict/batch", json=payload).raise_for_status()
+                batch.append(time.perf_counter() - start)
+            results[f"predict_batch_{batch_size}"] = latency_summary(batch)
+        return results
+    finally:
+        deployment.set_active_model(previous)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(sizes: list, max_train_rows: int, requests: int, data_dir: str = None) -> dict:
+    config = load_config("configs/config.yaml")
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            n_rows = SIZES[size]
+            raw_path = os.path.join(data_dir or tmp, f"synthetic_wine_{size}.csv")
+            if not os.path.exists(raw_path):
+                _, generate_seconds = timed(write_wine_csv, raw_path, n_rows)
+                print(f"Generated {n_rows} rows in {generate_seconds:.1f}s")
+
+            df, result = bench_preprocessing(raw_path, config["data"].get("compact_dtypes", False))
+            model, transform, fit_result = bench_fit(df, config, max_train_rows)
+            result = {"size": size, "rows": n_rows, **result, **fit_result, **bench_api(model, transform, df, requests)}
+            report["results"].append(result)
+            print(json.dumps(result))
+            del df, model
+    return report
+
+
+def compare(report: dict, baseline: dict):
+    """Print the relative change of every timing against a baseline report."""
+    baseline_results = {result["size"]: result for result in baseline["results"]}
+    for result in report["results"]:
+        previous = baseline_results.get(result["size"])
+        if previous is None:
+            continue
+        for name, value in result.items():
+            if isinstance(value, dict):
+                pairs = [(f"{name}.p50_ms", value["p50_ms"], previous.get(name, {}).get("p50_ms"))]
+            elif name.endswith("_s"):
+                pairs = [(name, value, previous.get(name))]
+            else:
+                continue
+            for label, current, before in pairs:
+                if before:
+                    print(f"{result['size']:>4} {label:<32} {before:>10.4f} -> {current:>10.4f} "
+                          f"({(current / before - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, training and the prediction API.")
+    parser.add_argument("--sizes", default="10k,1m,10m", help=f"Comma-separated subset of {list(SIZES)}")
+    parser.add_argument("--max-train-rows", type=int, default=1_000_000,
+                        help="Subsample larger datasets to this many rows for the fit (0 = all rows)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per /predict timing")
+    parser.add_argument("--data-dir", help="Keep the generated datasets here and reuse them across runs")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Print changes against a previous JSON report")
+    args = parser.parse_args()
+
+    report = run(args.sizes.split(","), args.max_train_rows, args.requests, args.data_dir)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r") as file:
+            compare(report, json.load(file))
@@ -0,0 +1,47 @@
+"""
+Synthetic Wine Data.
+
+Generates wine datasets with the schema of data/raw/winequality-red.csv at any
+size, by resampling the real rows and jittering every measurement slightly
+within its observed range. Large datasets are written in chunks, so the
+generator never holds more than one chunk in memory.
+"""
+
+import numpy as np
+import pandas as pd
+
+SOURCE_PATH = "data/raw/winequality-red.csv"
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+
+def generate_wine_data(n_rows: int, seed: int = 0, source: pd.DataFrame = None, noise: float = 0.05) -> pd.DataFrame:
+    """
+    Generate n_rows synthetic wines.
+
+    :param n_rows: Number of rows.
+    :param seed: Random seed.
+    :param source: Real data to resample (read from SOURCE_PATH by default).
+    :param noise: Standard deviation of the jitter, as a fraction of each column's standard deviation.
+    :return: DataFrame with the source columns; quality stays an integer grade.
+    """
+    if source is None:
+        source = pd.read_csv(SOURCE_PATH)
+    rng = np.random.default_rng(seed)
+    rows = source.iloc[rng.integers(0, len(source), size=n_rows)].reset_index(drop=True)
+
+    measurements = [column for column in source.columns if column != "quality"]
+    values = rows[measurements].to_numpy(dtype=np.float64)
+    values += rng.normal(0.0, 1.0, size=values.shape) * (source[measurements].std().to_numpy() * noise)
+    np.clip(values, source[measurements].min().to_numpy(), source[measurements].max().to_numpy(), out=values)
+    rows[measurements] = np.round(values, 5)
+    return rows
+
+
+def write_wine_csv(path: str, n_rows: int, seed: int = 0, chunk_rows: int = 1_000_000) -> str:
+    """Write n_rows synthetic wines to a comma-separated CSV in chunks and return the path."""
+    source = pd.read_csv(SOURCE_PATH)
+    for i, start in enumerate(range(0, n_rows, chunk_rows)):
+        chunk = generate_wine_data(min(chunk_rows, n_rows - start), seed=seed + i, source=source)
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
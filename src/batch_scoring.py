@@ -0,0 +1,176 @@
+"""
+Batch Scoring Module.
+
+This module scores large CSV, Parquet or Feather files offline. The input is
+read in chunks (Parquet and Feather through a memory map), the features are
+built by the feature transform saved with the model, and the chunks are scored in
+a process pool where every worker loads the model once. Predictions are
+written chunk by chunk in input order, with a bounded number of chunks in
+flight, so memory use does not grow with the size of the input.
+
+Usage:
+    python -m src.batch_scoring input.csv predictions.parquet [--chunksize 100000] [--workers 8]
+                                [--run-id <mlflow run>] [--include-input]
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+import mlflow
+import pandas as pd
+
+from src.data_preprocessing import detect_separator
+from src.model_loader import LoadedModel, latest_model_version, load_model
+from src.utils import PROCESSED_FORMATS, ProcessedDataWriter, load_config, read_csv
+
+# Model loaded by _init_worker, once per worker process
+_worker_model: Optional[LoadedModel] = None
+# Memory-mapped Feather table of the input, opened once per worker process
+_worker_table = None
+
+
+def file_format_of(path: str) -> str:
+    """Infer "csv", "parquet" or "feather" from a file extension."""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    file_format = {"pq": "parquet", "arrow": "feather", "ipc": "feather"}.get(extension, extension)
+    if file_format not in PROCESSED_FORMATS:
+        raise ValueError(f"Cannot infer the format of '{path}', expected one of {PROCESSED_FORMATS}")
+    return file_format
+
+
+def _open_feather(path: str):
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _init_worker(config: dict, run_id: str, feather_path: Optional[str]):
+    """Process pool initializer: load the model (and map the Feather input) once per worker."""
+    global _worker_model, _worker_table
+    mlflow.set_tracking_uri(config["mlflow"]["tracking_uri"])
+    _worker_model = load_model(config, run_id)
+    if feather_path is not None:
+        _worker_table = _open_feather(feather_path)
+
+
+def score_frame(df: pd.DataFrame, loaded: LoadedModel, include_input: bool = False) -> pd.DataFrame:
+    """
+    Build the model features of a chunk of raw rows and predict their quality.
+
+    Args:
+        df (DataFrame): Raw wine measurements (other columns, e.g. "quality", are ignored).
+        loaded (LoadedModel): The model and the feature transform it was trained with.
+        include_input (bool): Return the input columns next to the predictions.
+
+    Returns:
+        DataFrame: "predicted_quality", preceded by the input columns if requested.
+    """
+    predictions = loaded.model.predict(loaded.transform.transform_frame(df))
+    result = df if include_input else pd.DataFrame(index=df.index)
+    result["predicted_quality"] = predictions
+    return result.reset_index(drop=True)
+
+
+def _score_chunk(df: pd.DataFrame, include_input: bool) -> pd.DataFrame:
+    return score_frame(df, _worker_model, include_input)
+
+
+def _score_feather_slice(offset: int, length: int, include_input: bool) -> pd.DataFrame:
+    # Only the slice bounds cross the process boundary; the rows are read from the worker's memory map
+    return score_frame(_worker_table.slice(offset, length).to_pandas(), _worker_model, include_input)
+
+
+def iter_chunks(path: str, file_format: str, chunksize: int, compact: bool = False) -> Iterator[pd.DataFrame]:
+    """Yield the rows of a CSV or Parquet file as DataFrames of at most chunksize rows (CSV optionally compact)."""
+    if file_format == "csv":
+        yield from read_csv(path, compact, sep=detect_separator(path), chunksize=chunksize)
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Chunked reading is not supported for '{file_format}'")
+
+
+def score_file(input_path: str, output_path: str, config: dict, chunksize: int = 100000,
+               n_workers: Optional[int] = None, run_id: Optional[str] = None, include_input: bool = False,
+               max_in_flight: Optional[int] = None) -> dict:
+    """
+    Score every row of an input file and write the predictions in input order.
+
+    Args:
+        input_path (str): CSV, Parquet or Feather file with the raw measurements.
+        output_path (str): Output file; its format (CSV, Parquet or Feather) follows the extension.
+        config (dict): Pipeline configuration (inference engine, export dir, MLflow URI).
+        chunksize (int): Rows per chunk.
+        n_workers (int): Worker processes (None uses all cores).
+        run_id (str): MLflow run of the model to use (defaults to the latest trained model).
+        include_input (bool): Write the input columns next to the predictions.
+        max_in_flight (int): Chunks submitted but not yet written (defaults to twice the workers).
+
+    Returns:
+        dict: "run_id", "rows", "chunks" and "seconds".
+    """
+    start = time.perf_counter()
+    mlflow.set_tracking_uri(config["mlflow"]["tracking_uri"])
+    # Resolve the model once, so all workers score with the same one even if training finishes meanwhile
+    run_id = run_id or latest_model_version(config)
+    if run_id is None:
+        raise ValueError("No trained model found")
+
+    input_format = file_format_of(input_path)
+    n_workers = n_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * n_workers
+    feather_path = input_path if input_format == "feather" else None
+
+    rows = chunks = 0
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                             initargs=(config, run_id, feather_path)) as executor, \
+            ProcessedDataWriter(output_path, file_format_of(output_path)) as writer:
+
+        def write_oldest():
+            nonlocal rows, chunks
+            result = pending.popleft().result()
+            writer.write(result)
+            rows += len(result)
+            chunks += 1
+
+        if feather_path is not None:
+            n_rows = _open_feather(feather_path).num_rows
+            submissions = ((_score_feather_slice, offset, min(chunksize, n_rows - offset), include_input)
+                           for offset in range(0, n_rows, chunksize))
+        else:
+            submissions = ((_score_chunk, chunk, include_input)
+                           for chunk in iter_chunks(input_path, input_format, chunksize,
+                                                    config.get("data", {}).get("compact_dtypes", False)))
+
+        for fn, *args in submissions:
+            # Bounded memory: wait for the oldest chunk before reading further ahead
+            if len(pending) >= max_in_flight:
+                write_oldest()
+            pending.append(executor.submit(fn, *args))
+        while pending:
+            write_oldest()
+
+    return {"run_id": run_id, "rows": rows, "chunks": chunks, "seconds": time.perf_counter() - start}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a CSV, Parquet or Feather file with the latest trained model.")
+    parser.add_argument("input", help="Raw wine measurements (.csv, .parquet or .feather)")
+    parser.add_argument("output", help="Predictions file (.csv, .parquet or .feather)")
+    parser.add_argument("--config", default="configs/config.yaml")
+    parser.add_argument("--chunksize", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--run-id", default=None, help="MLflow run of the model (default: latest)")
+    parser.add_argument("--include-input", action="store_true", help="Also write the input columns")
+    args = parser.parse_args()
+
+    summary = score_file(args.input, args.output, load_config(args.config), args.chunksize, args.workers,
+                         args.run_id, args.include_input)
+    print(f"Scored {summary['rows']} rows in {summary['chunks']} chunks with the model of run {summary['run_id']} "
+          f"in {summary['seconds']:.1f}s ({summary['rows'] / max(summary['seconds'], 1e-9):.0f} rows/s)")
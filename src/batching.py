@@ -0,0 +1,142 @@
+"""
+Micro-batching Module.
+
+This module queues single-row prediction requests and evaluates them together
+in one vectorized predict call, trading a small bounded wait for throughput.
+Each row carries the model it was submitted for, so a model swapped in while
+rows are queued never answers rows captured under the previous one.
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Optional, Union
+
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn: Callable[[np.ndarray, Any], Union[np.ndarray, Awaitable[np.ndarray]]],
+                 n_features: int, max_batch_size: int = 64, max_wait_ms: float = 5.0, latency_window: int = 10000):
+        """
+        Initialize the micro-batcher.
+
+        :param predict_fn: Function mapping a 2-D feature matrix and the model its rows were submitted for
+            to a 1-D array of predictions. A coroutine function is awaited (it offloads the work itself);
+            a plain function runs on the default executor.
+        :param n_features: Number of columns of each submitted feature row.
+        :param max_batch_size: Maximum number of rows evaluated in one predict call.
+        :param max_wait_ms: Maximum time the first queued row waits for the batch to fill.
+        :param latency_window: Number of most recent request latencies kept for percentiles.
+        """
+        self.predict_fn = predict_fn
+        self.n_features = n_features
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = None
+        self.worker = None
+        self.latencies = deque(maxlen=latency_window)
+        self.batch_sizes = Counter()
+        self.requests_total = 0
+        self.batches_total = 0
+
+    async def start(self):
+        """Start the background task that drains the queue."""
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task after the queued rows have been answered."""
+        if self.worker is None:
+            return
+        await self.queue.join()
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    async def submit(self, row: np.ndarray, model: Any = None) -> float:
+        """
+        Queue one feature row and wait for its prediction.
+
+        :param row: 1-D feature vector of length n_features.
+        :param model: Model to predict the row with, passed on to predict_fn; rows submitted
+            for different models are predicted in separate calls.
+        :return: The predicted value for this row.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, model, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        """Wait for one row, then keep collecting until the batch is full or max_wait elapsed."""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Group by model (by identity: only a reload mixes models within one batch)
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[1]), []).append(item)
+            for group in groups.values():
+                await self._predict_group(group)
+
+    async def _predict_group(self, group: list):
+        X = np.empty((len(group), self.n_features), dtype=np.float64)
+        for i, (row, _, _, _) in enumerate(group):
+            X[i] = row
+        model = group[0][1]
+
+        # Run the CPU-bound predict off the event loop so new requests keep queueing
+        try:
+            if asyncio.iscoroutinefunction(self.predict_fn):
+                predictions = await self.predict_fn(X, model)
+            else:
+                predictions = await asyncio.get_running_loop().run_in_executor(None, self.predict_fn, X, model)
+            error = None
+        except Exception as e:
+            error = e
+
+        now = time.perf_counter()
+        for i, (_, _, future, enqueued_at) in enumerate(group):
+            if not future.done():
+                if error is None:
+                    future.set_result(float(predictions[i]))
+                else:
+                    future.set_exception(error)
+            self.latencies.append(now - enqueued_at)
+            self.queue.task_done()
+
+        self.batch_sizes[len(group)] += 1
+        self.batches_total += 1
+        self.requests_total += len(group)
+
+    def stats(self) -> dict:
+        """Return latency percentiles (in milliseconds) and batch-size counters."""
+        latencies = np.fromiter(self.latencies, dtype=np.float64) * 1000.0
+        p50: Optional[float] = float(np.percentile(latencies, 50)) if len(latencies) else None
+        p99: Optional[float] = float(np.percentile(latencies, 99)) if len(latencies) else None
+        return {
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "mean_batch_size": self.requests_total / self.batches_total if self.batches_total else 0.0,
+            "batch_size_counts": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "latency_ms_p50": p50,
+            "latency_ms_p99": p99,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
@@ -0,0 +1,94 @@
+"""
+Cross-Validation Module.
+
+This module runs k-fold cross-validation of a RandomForestRegressor with one
+worker process per fold. The feature matrix and target live in shared memory,
+so the folds slice a single copy instead of each worker receiving its own.
+
+The rows are stored in fold order twice in a row: fold i's test rows are the
+contiguous block [start, stop) and its training rows are the block
+[stop, start + n_rows) that wraps around into the second copy, so both are
+NumPy views and fitting a fold copies no data.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import KFold
+
+from src.shared_arrays import init_worker, release_arrays, share_arrays, worker_arrays
+
+FOLD_METRICS = ("r2", "mse", "rmse", "mae")
+
+
+def _run_fold(fold: int, test_start: int, test_stop: int, params: dict) -> dict:
+    """Fit and score one fold on views of the shared arrays (runs in a worker process)."""
+    arrays = worker_arrays()
+    X, y = arrays["X"], arrays["y"]
+    n_rows = len(y) // 2
+    train = slice(test_stop, test_start + n_rows)
+    start = time.perf_counter()
+    model = RandomForestRegressor(**params)
+    model.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - start
+
+    y_test = y[test_start:test_stop]
+    residuals = model.predict(X[test_start:test_stop]) - y_test
+    mse = float(np.mean(residuals ** 2))
+    return {
+        "fold": fold,
+        "n_train": n_rows - len(y_test),
+        "n_test": len(y_test),
+        "r2": 1.0 - mse * len(y_test) / float(np.sum((y_test - y_test.mean()) ** 2)),
+        "mse": mse,
+        "rmse": mse ** 0.5,
+        "mae": float(np.mean(np.abs(residuals))),
+        "fit_seconds": fit_seconds,
+    }
+
+
+def cross_validate_parallel(X, y, params: dict, n_splits: int = 5, random_state: int = 42,
+                            n_workers: Optional[int] = None) -> List[dict]:
+    """
+    Run k-fold cross-validation with the folds evaluated in parallel.
+
+    Args:
+        X: Feature matrix.
+        y: Target values.
+        params (dict): RandomForestRegressor parameters (n_jobs and warm_start are overridden).
+        n_splits (int): Number of folds.
+        random_state (int): Seed of the shuffled KFold split, so folds are reproducible.
+        n_workers (int): Number of worker processes (None uses all cores).
+
+    Returns:
+        list: Per-fold results in fold order with "r2", "mse", "rmse", "mae" and "fit_seconds".
+    """
+    # One core per fold; parallelism comes from the process pool
+    params = {**params, "n_jobs": 1, "warm_start": False}
+    # The KFold test folds in fold order, so every fold is a contiguous block of the reordered rows
+    test_folds = [test_index for _, test_index in
+                  KFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(np.arange(len(y)))]
+    order = np.tile(np.concatenate(test_folds), 2)
+    bounds = np.cumsum([0] + [len(test_index) for test_index in test_folds])
+
+    specs, segments = share_arrays(X=np.asarray(X, dtype=np.float32)[order], y=np.asarray(y, dtype=np.float64)[order])
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(specs,)) as executor:
+            futures = [executor.submit(_run_fold, fold, int(bounds[fold]), int(bounds[fold + 1]), params)
+                       for fold in range(n_splits)]
+            return [future.result() for future in futures]
+    finally:
+        release_arrays(segments)
+
+
+def summarize_folds(folds: List[dict]) -> dict:
+    """Return the mean and standard deviation of every fold metric."""
+    summary = {}
+    for metric in FOLD_METRICS:
+        values = np.array([fold[metric] for fold in folds])
+        summary[f"{metric}_mean"] = float(values.mean())
+        summary[f"{metric}_std"] = float(values.std())
+    return summary
@@ -1,26 +1,38 @@
+import os
 import pandas as pd
 from prefect import task, flow, get_run_logger
 import yaml
-from src.utils import load_config
+from src.utils import load_config, read_csv, ProcessedDataWriter, write_processed_data
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from prefect_dask import DaskTaskRunner
+from src.stage_cache import StageCache
+from src.features import RATIO_EPSILON, RATIO_FEATURES
+from src.profiling import profiled, profiling_run
 
 # Task to load raw data from CSV file
 @task
-def load_data(file_path: str) -> pd.DataFrame:
+@profiled()
+def load_data(file_path: str, compact: bool = False) -> pd.DataFrame:
     """
     Loads data from a CSV file, ensuring proper column separation, and returns the DataFrame.
     
     Args:
         file_path (str): The path to the CSV file to be loaded.
+        compact (bool): Parse the measurements as float32 and quality as int8.
     
     Returns:
         DataFrame: The processed DataFrame.
     """
     logger = get_run_logger()
     try:
+        if compact:
+            # The compact dtypes are assigned by column name, so the separator is detected up front
+            df = read_csv(file_path, compact=True, sep=detect_separator(file_path))
+            logger.info("Data loaded successfully (compact dtypes)!")
+            return df
+
         # Attempt to read the CSV with a semicolon as separator (common for the Wine Quality dataset)
         df = pd.read_csv(file_path, sep=";")
         
@@ -39,6 +51,7 @@ def load_data(file_path: str) -> pd.DataFrame:
 
 # Task to clean the data (handle missing values, type conversion, etc.)
 @task
+@profiled()
 def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Cleans the data by handling missing values and performing necessary type conversions.
@@ -60,11 +73,18 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
         logger.info("Handling missing values by dropping rows.")
         df = df.dropna().reset_index(drop=True)
     
+    # Nullable integer columns (compact loads of files with missing grades) go back to NumPy integers
+    nullable = {column: dtype.numpy_dtype for column, dtype in df.dtypes.items()
+                if pd.api.types.is_extension_array_dtype(dtype) and pd.api.types.is_integer_dtype(dtype)}
+    if nullable:
+        df = df.astype(nullable)
+    
     logger.info("Data cleaned successfully!")
     return df
 
 # Task to perform feature engineering on the dataset
 @task
+@profiled()
 def feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
     """
     Performs feature engineering on the data, such as creating new features.
@@ -78,31 +98,233 @@ def feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
     logger = get_run_logger()
     logger.info("Performing feature engineering...")
     
-    # Example: Create a new feature 'acidity_ratio' if the required columns are present
-    if 'fixed acidity' in df.columns and 'volatile acidity' in df.columns:
-        df['acidity_ratio'] = df['fixed acidity'] / (df['volatile acidity'] + 1e-5)
+    df = add_engineered_features(df)
     
     logger.info("Feature engineering complete!")
     return df
 
-# Task to save the processed data to CSV
+def add_engineered_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the engineered features to a DataFrame in place. Used by the feature_engineering
+    task and, outside of Prefect, by batch scoring.
+    
+    Args:
+        df (DataFrame): The cleaned DataFrame.
+        
+    Returns:
+        DataFrame: The DataFrame with additional features.
+    """
+    # Create the ratio features (e.g. 'acidity_ratio') whose columns are present; the API and
+    # batch scoring compute the same ratios through src.features.FeatureTransform
+    for name, (numerator, denominator) in RATIO_FEATURES.items():
+        if numerator in df.columns and denominator in df.columns:
+            df[name] = df[numerator] / (df[denominator] + RATIO_EPSILON)
+    return df
+
+# Task to save the processed data (CSV, Parquet or Feather)
 @task
-def save_data(df: pd.DataFrame, path: str):
+@profiled()
+def save_data(df: pd.DataFrame, path: str, file_format: str = "csv"):
     """
-    Saves the processed data to a CSV file.
+    Saves the processed data to a file in the configured format.
     
     Args:
         df (DataFrame): The DataFrame to be saved.
-        path (str): The path where the CSV file will be stored.
+        path (str): The path where the file will be stored.
+        file_format (str): "csv", "parquet" or "feather".
     """
     logger = get_run_logger()
     try:
-        df.to_csv(path, index=False)
+        write_processed_data(df, path, file_format)
         logger.info(f"Data saved to {path}")
     except Exception as e:
         logger.error(f"Error saving data: {e}")
         raise
 
+def detect_separator(file_path: str) -> str:
+    """
+    Detects the column separator of a CSV file from its header line.
+    
+    Args:
+        file_path (str): The path to the CSV file.
+    
+    Returns:
+        str: ";" for the semicolon-separated Wine Quality format, otherwise ",".
+    """
+    with open(file_path, "r") as file:
+        header_line = file.readline()
+    return ";" if ";" in header_line else ","
+
+# Task to process a large raw CSV chunk by chunk with bounded memory
+@task
+@profiled()
+def stream_process_data(raw_path: str, processed_path: str, chunksize: int, file_format: str = "csv",
+                        compact: bool = False) -> int:
+    """
+    Reads the raw CSV in chunks, applies cleaning and feature engineering per chunk
+    and appends each chunk to the output file, so peak memory depends on the chunk
+    size instead of the file size.
+    
+    Both steps work row by row, so the output is identical to the in-memory path
+    as long as every column parses to the same type in every chunk.
+    
+    Args:
+        raw_path (str): The path to the raw CSV file.
+        processed_path (str): The path where the processed file will be stored.
+        chunksize (int): Number of rows per chunk.
+        file_format (str): "csv", "parquet" or "feather".
+        compact (bool): Parse the chunks as float32 measurements and int8 quality.
+    
+    Returns:
+        int: The number of rows written.
+    """
+    logger = get_run_logger()
+    sep = detect_separator(raw_path)
+    rows_written = 0
+    try:
+        with ProcessedDataWriter(processed_path, file_format) as writer:
+            for i, chunk in enumerate(read_csv(raw_path, compact, sep=sep, chunksize=chunksize)):
+                # The undecorated functions: this stage is profiled as a whole, not once per chunk
+                chunk = feature_engineering.fn.__wrapped__(clean_data.fn.__wrapped__(chunk))
+                writer.write(chunk)
+                rows_written += len(chunk)
+                logger.info(f"Processed chunk {i + 1} ({rows_written} rows written so far)")
+    except Exception as e:
+        logger.error(f"Error streaming data: {e}")
+        raise
+    logger.info(f"Streamed {rows_written} rows to {processed_path}")
+    return rows_written
+
+def split_partitions(df: pd.DataFrame, n_partitions: int) -> list:
+    """
+    Splits a DataFrame into contiguous row ranges of (almost) equal size.
+    
+    Args:
+        df (DataFrame): The DataFrame to split.
+        n_partitions (int): Number of partitions.
+    
+    Returns:
+        list: The partitions in row order.
+    """
+    bounds = np.linspace(0, len(df), num=max(1, n_partitions) + 1).astype(int)
+    return [df.iloc[start:stop].copy() for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+def process_partitions(partitions: list) -> pd.DataFrame:
+    """
+    Submits cleaning and feature engineering for every partition to the flow's task
+    runner, then merges the results in partition order, so the output does not
+    depend on which partition finishes first.
+    
+    Must be called inside a flow.
+    
+    Args:
+        partitions (list): DataFrames (or futures of DataFrames) in row order.
+    
+    Returns:
+        DataFrame: The processed partitions concatenated with a fresh index.
+    """
+    futures = [feature_engineering.submit(clean_data.submit(partition)) for partition in partitions]
+    return pd.concat([future.result() for future in futures], ignore_index=True)
+
+def cached_process_data(raw_path: str, cache: StageCache, compact: bool = False) -> pd.DataFrame:
+    """
+    Runs load_data, clean_data and feature_engineering with on-disk caching of each
+    stage's output.
+    
+    Every stage is keyed on the key of its input (starting from a content hash of
+    the raw file) and the hash of its own source code, so a stage only reruns when
+    its input or its code changed. If the raw file only grew by appended rows
+    since the previous run, just the new rows are processed and appended to the
+    previously cached output.
+    
+    Must be called inside a flow.
+    
+    Args:
+        raw_path (str): The path to the raw CSV file.
+        cache (StageCache): The cache holding the stage outputs.
+        compact (bool): Load the raw data with compact dtypes (see load_data).
+    
+    Returns:
+        DataFrame: The processed data.
+    """
+    logger = get_run_logger()
+    previous = cache.read_manifest(raw_path)
+    file_size = os.path.getsize(raw_path)
+    previous_size = previous["size"] if previous and previous["size"] <= file_size else None
+    raw_hash, prefix_hash = cache.hash_file(raw_path, previous_size)
+
+    versions = [cache.code_version(stage.fn) for stage in (load_data, clean_data, feature_engineering)]
+    # feature_engineering delegates to add_engineered_features, so its version covers both
+    versions[2] = cache.key("feature_engineering", versions[2], cache.code_version(add_engineered_features))
+    if compact:
+        # Compact and default loads produce different outputs, so they are cached separately
+        versions[0] = cache.key("load_data", versions[0], "compact")
+    load_key = cache.key("load_data", versions[0], raw_hash)
+    clean_key = cache.key("clean_data", versions[1], load_key)
+    features_key = cache.key("feature_engineering", versions[2], clean_key)
+
+    appended = (
+        previous is not None
+        and file_size > previous["size"]
+        and prefix_hash == previous["raw_hash"]
+        and previous["versions"] == versions
+        and previous["ends_with_newline"]
+    )
+
+    df = cache.load("feature_engineering", features_key)
+    previous_output = new_rows = None
+    if df is None and appended:
+        previous_output = cache.load("feature_engineering", previous["features_key"])
+    if previous_output is not None:
+        # Parse only the bytes appended since the previous run, with the previous column types
+        try:
+            with open(raw_path, "rb") as file:
+                file.seek(previous["size"])
+                new_rows = pd.read_csv(file, sep=previous["sep"], header=None,
+                                       names=previous["columns"], dtype=previous["dtypes"])
+        except ValueError as e:
+            logger.info(f"Appended rows don't match the previous column types ({e}); reprocessing everything.")
+
+    if df is not None:
+        run_mode = "cached"
+        logger.info("Raw data and stage code unchanged; using cached output.")
+    elif new_rows is not None:
+        run_mode = "incremental"
+        logger.info(f"Processing {len(new_rows)} appended rows.")
+        df_new = feature_engineering(clean_data(new_rows))
+        df = pd.concat([previous_output, df_new], ignore_index=True)
+        cache.save("feature_engineering", features_key, df)
+    else:
+        run_mode = "full"
+        df_clean = cache.load("clean_data", clean_key)
+        if df_clean is None:
+            df_raw = cache.load("load_data", load_key)
+            if df_raw is None:
+                df_raw = load_data(raw_path, compact)
+                cache.save("load_data", load_key, df_raw)
+            df_clean = clean_data(df_raw)
+            cache.save("clean_data", clean_key, df_clean)
+        df = feature_engineering(df_clean)
+        cache.save("feature_engineering", features_key, df)
+
+    sep = detect_separator(raw_path)
+    columns = list(pd.read_csv(raw_path, sep=sep, nrows=0).columns)
+    with open(raw_path, "rb") as file:
+        file.seek(max(file_size - 1, 0))
+        ends_with_newline = file.read(1) == b"\n"
+    cache.write_manifest(raw_path, {
+        "size": file_size,
+        "raw_hash": raw_hash,
+        "features_key": features_key,
+        "versions": versions,
+        "sep": sep,
+        "columns": columns,
+        "dtypes": {column: str(df[column].dtype) for column in columns if column in df.columns},
+        "ends_with_newline": ends_with_newline,
+        "last_run": run_mode,
+    })
+    return df
+
 # Orchestrating the entire data processing pipeline using Prefect and DaskTaskRunner
 @flow(name="Wine Quality Data Processing Pipeline", task_runner=DaskTaskRunner())
 def data_processing_pipeline():
@@ -116,14 +338,47 @@ def data_processing_pipeline():
     config = load_config("configs/config.yaml")
     raw_path = config["data"]["raw_path"]
     processed_path = config["data"]["processed_path"]
+    processed_format = config["data"].get("processed_format", "csv")
+    compact = config["data"].get("compact_dtypes", False)
     
-    # Execute tasks in sequence
-    df = load_data(raw_path)
-    df_clean = clean_data(df)
-    df_features = feature_engineering(df_clean)
-    save_data(df_features, processed_path)
+    # Large files are streamed in chunks instead of being loaded into memory at once
+    streaming = config["data"].get("streaming", {})
+    partitioning = config["data"].get("partitions", {})
+    if streaming.get("enabled", False):
+        stream_process_data(raw_path, processed_path, streaming.get("chunksize", 100000), processed_format, compact)
+    elif partitioning.get("enabled", False):
+        # Process partitions in parallel on the Dask workers: one partition per
+        # source file, or row ranges of a single file
+        if isinstance(raw_path, list):
+            partitions = [load_data.submit(path, compact) for path in raw_path]
+        else:
+            partitions = split_partitions(load_data(raw_path, compact), partitioning.get("n_partitions", 4))
+        df_features = process_partitions(partitions)
+        save_data(df_features, processed_path, processed_format)
+    elif config["data"].get("cache", {}).get("enabled", False):
+        # Skip unchanged stages and only process newly appended raw rows
+        df_features = cached_process_data(raw_path, StageCache(config["data"]["cache"]["dir"]), compact)
+        save_data(df_features, processed_path, processed_format)
+    else:
+        # Execute tasks in sequence
+        df = load_data(raw_path, compact)
+        df_clean = clean_data(df)
+        df_features = feature_engineering(df_clean)
+        save_data(df_features, processed_path, processed_format)
     
     logger.info("Data processing pipeline completed successfully!")
 
 if __name__ == "__main__":
-    data_processing_pipeline()
\ No newline at end of file
+    # Size the local Dask cluster from the configuration
+    config = load_config("configs/config.yaml")
+    n_workers = config["data"].get("partitions", {}).get("n_workers")
+    if n_workers:
+        data_processing_pipeline = data_processing_pipeline.with_options(
+            task_runner=DaskTaskRunner(cluster_kwargs={"n_workers": n_workers})
+        )
+    if config.get("profiling", {}).get("enabled", False):
+        # Started before the Dask workers, so the task stages can log to this run
+        with profiling_run("data_processing", config["mlflow"]["tracking_uri"]):
+            data_processing_pipeline()
+    else:
+        data_processing_pipeline()
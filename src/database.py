@@ -1,38 +1,313 @@
+import csv
+import io
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional, Sequence
+
 import psycopg2
-from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
+
+# DDL of the tables written by the pipeline, created once per Database instance by ensure_table
+TABLES = {
+    "model_results": """
+        CREATE TABLE IF NOT EXISTS model_results (
+            id SERIAL PRIMARY KEY,
+            accuracy FLOAT,
+            loss FLOAT,
+            model_name VARCHAR(255),
+            run_id VARCHAR(64),
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            hyperparameters TEXT,
+            mse FLOAT,
+            rmse FLOAT,
+            mae FLOAT,
+            r2 FLOAT
+        );
+    """,
+    "cv_results": """
+        CREATE TABLE IF NOT EXISTS cv_results (
+            id SERIAL PRIMARY KEY,
+            run_id VARCHAR(64),
+            model_name VARCHAR(255),
+            fold INTEGER,
+            r2 FLOAT,
+            mse FLOAT,
+            rmse FLOAT,
+            mae FLOAT
+        );
+    """,
+    "prediction_logs": """
+        CREATE TABLE IF NOT EXISTS prediction_logs (
+            id SERIAL PRIMARY KEY,
+            created_at TIMESTAMP,
+            endpoint VARCHAR(32),
+            run_id VARCHAR(64),
+            features TEXT,
+            predicted_quality FLOAT,
+            latency_ms FLOAT
+        );
+    """,
+}
+
+
+# Indexes created with their table; existing databases get them from the Alembic migrations
+INDEXES = {
+    "model_results": [
+        "CREATE INDEX IF NOT EXISTS ix_model_results_run_id ON model_results (run_id);",
+        "CREATE INDEX IF NOT EXISTS ix_model_results_created_at ON model_results (created_at);",
+        "CREATE INDEX IF NOT EXISTS ix_model_results_model_name_created_at ON model_results (model_name, created_at);",
+    ],
+}
+
+# Metrics stored in model_results, and whether higher values are better
+# (accuracy and loss hold the train and test R² scores written by the training flow)
+RESULT_METRICS = {"accuracy": True, "loss": True, "r2": True, "mse": False, "rmse": False, "mae": False}
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name as a SQL identifier (the quoting of psycopg2's sql.Identifier)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _FactoryPool:
+    """Minimal thread-safe pool over a DB-API connection factory, with the interface of psycopg2's pools."""
+
+    def __init__(self, connection_factory: Callable, max_connections: int):
+        self.connection_factory = connection_factory
+        self.max_connections = max_connections
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.connection_factory()
+
+    def putconn(self, connection, close: bool = False):
+        with self._lock:
+            if not close and len(self._idle) < self.max_connections:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
 
 class Database:
-    def __init__(self, dbname: str, user: str, password: str, host: str = "localhost", port: str = "5432"):
+    def __init__(self, dbname: str = None, user: str = None, password: str = None, host: str = "localhost",
+                 port: str = "5432", min_connections: int = 1, max_connections: int = 5,
+                 connection_factory: Optional[Callable] = None, paramstyle: str = "format"):
         """
         Initialize the database connection parameters.
         
+        Connections are pooled: psycopg2's ThreadedConnectionPool by default, or a
+        small pool over connection_factory (e.g. sqlite3 for local testing).
+        
         :param dbname: Name of the database.
         :param user: Database user name.
         :param password: Password for the database user.
         :param host: Database host (default is "localhost").
         :param port: Database port (default is "5432").
+        :param min_connections: Connections opened when the pool is created.
+        :param max_connections: Maximum number of pooled connections.
+        :param connection_factory: Callable returning a new DB-API connection, used instead of psycopg2.
+        :param paramstyle: Placeholder style of the driver: "format" (%s, psycopg2) or "qmark" (?, sqlite3).
         """
         self.dbname = dbname
         self.user = user
         self.password = password
         self.host = host
         self.port = port
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.connection_factory = connection_factory
+        self.paramstyle = paramstyle
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        self._ready_tables = set()
         self.connection = None
         self.cursor = None
 
-    def connect(self):
-        """Connect to the PostgreSQL database."""
-        try:
+    def __enter__(self):
+        self.open_pool()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open_pool(self):
+        """Create the connection pool (idempotent)."""
+        with self._pool_lock:
+            if self.pool is not None:
+                return
+            if self.connection_factory is not None:
+                self.pool = _FactoryPool(self.connection_factory, self.max_connections)
+                return
             print("Connecting to the database...")
-            self.connection = psycopg2.connect(
+            self.pool = ThreadedConnectionPool(
+                self.min_connections,
+                self.max_connections,
                 dbname=self.dbname,
                 user=self.user,
                 password=self.password,
                 host=self.host,
                 port=self.port
             )
+            print(f"Connection pool to the {self.dbname} database at {self.host}:{self.port} is ready")
+
+    def _sql(self, query: str) -> str:
+        """Convert %s placeholders to the driver's paramstyle."""
+        return query.replace("%s", "?") if self.paramstyle == "qmark" else query
+
+    @contextmanager
+    def transaction(self):
+        """
+        Borrow a pooled connection for one transaction.
+        
+        Commits when the block succeeds and rolls back if it raises; the connection
+        is returned to the pool either way.
+        
+        :return: A cursor on the borrowed connection.
+        """
+        self.open_pool()
+        connection = self.pool.getconn()
+        broken = False
+        try:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                try:
+                    connection.rollback()
+                except Exception:
+                    broken = True
+                raise
+            finally:
+                cursor.close()
+        finally:
+            self.pool.putconn(connection, close=broken)
+
+    def ensure_table(self, table: str):
+        """
+        Create one of the TABLES and its INDEXES if they do not exist; only the first call per instance
+        touches the database.
+
+        :raises RuntimeError: If the indexes can't be created, typically because the table predates
+            the columns they cover and the Alembic migrations have not been applied.
+        """
+        if table in self._ready_tables:
+            return
+        with self.transaction() as cursor:
+            cursor.execute(TABLES[table])
+        try:
+            with self.transaction() as cursor:
+                for index_query in INDEXES.get(table, []):
+                    cursor.execute(index_query)
+        except Exception as e:
+            print(f"Error creating the indexes of {table}: {e}")
+            raise RuntimeError(f"Table {table} is missing columns of the current schema; "
+                               f"run 'alembic upgrade head' to migrate it") from e
+        self._ready_tables.add(table)
+
+    def insert_many(self, table: str, columns: Sequence[str], rows: Iterable[Sequence], use_copy: bool = False) -> int:
+        """
+        Insert rows in a single transaction.
+        
+        :param table: Target table (created first if it is one of TABLES).
+        :param columns: Column names, in the order of the row values.
+        :param rows: Row tuples.
+        :param use_copy: Stream the rows with COPY ... FROM STDIN when the driver supports it (psycopg2).
+        :return: Number of rows written.
+        """
+        rows = [tuple(row) for row in rows]
+        if not rows:
+            return 0
+        if table in TABLES:
+            self.ensure_table(table)
+        # Both paths quote the names the same way, so they accept the same tables and columns
+        target = f"{quote_identifier(table)} ({', '.join(map(quote_identifier, columns))})"
+        with self.transaction() as cursor:
+            if use_copy and hasattr(cursor, "copy_expert"):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {target} FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                placeholders = ", ".join(["%s"] * len(columns))
+                cursor.executemany(self._sql(f"INSERT INTO {target} VALUES ({placeholders});"), rows)
+        return len(rows)
+
+    def _fetch_dicts(self, query: str, params: tuple) -> list:
+        with self.transaction() as cursor:
+            cursor.execute(self._sql(query), params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def best_run(self, metric: str = "r2", model_name: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the model_results row with the best value of a metric.
+        
+        :param metric: One of RESULT_METRICS; r2 and the scores are maximized, the errors minimized.
+        :param model_name: Only consider runs of this model (served by the model_name index).
+        :return: The row as a dict, or None if no run has the metric.
+        """
+        if metric not in RESULT_METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        order = "DESC" if RESULT_METRICS[metric] else "ASC"
+        where, params = f"{metric} IS NOT NULL", ()
+        if model_name is not None:
+            where, params = f"model_name = %s AND {where}", (model_name,)
+        rows = self._fetch_dicts(
+            f"SELECT * FROM model_results WHERE {where} ORDER BY {metric} {order}, created_at DESC LIMIT 1;", params)
+        return rows[0] if rows else None
+
+    def latest_run(self, model_name: Optional[str] = None) -> Optional[dict]:
+        """Return the most recent model_results row, optionally of one model."""
+        where, params = "", ()
+        if model_name is not None:
+            where, params = "WHERE model_name = %s", (model_name,)
+        rows = self._fetch_dicts(f"SELECT * FROM model_results {where} ORDER BY created_at DESC, id DESC LIMIT 1;",
+                                 params)
+        return rows[0] if rows else None
+
+    def metric_over_time(self, metric: str = "r2", model_name: Optional[str] = None, since=None,
+                         limit: Optional[int] = None) -> list:
+        """
+        Return a metric of the stored runs in chronological order.
+        
+        :param metric: One of RESULT_METRICS.
+        :param model_name: Only runs of this model.
+        :param since: Only runs created at or after this timestamp.
+        :param limit: Only the most recent runs, at most this many.
+        :return: List of {"run_id", "created_at", "value"} dicts, oldest first.
+        """
+        if metric not in RESULT_METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        conditions, params = [f"{metric} IS NOT NULL"], []
+        if model_name is not None:
+            conditions.append("model_name = %s")
+            params.append(model_name)
+        if since is not None:
+            conditions.append("created_at >= %s")
+            params.append(since)
+        query = (f"SELECT run_id, created_at, {metric} AS value FROM model_results "
+                 f"WHERE {' AND '.join(conditions)} ORDER BY created_at DESC, id DESC")
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return self._fetch_dicts(query + ";", tuple(params))[::-1]
+
+    def connect(self):
+        """Borrow a pooled connection for the execute_query/fetch_all API."""
+        try:
+            self.open_pool()
+            self.connection = self.pool.getconn()
             self.cursor = self.connection.cursor()
-            print(f"Successfully connected to the {self.dbname} database at {self.host}:{self.port}")
         except Exception as e:
             print(f"Error connecting to the database: {e}")
             import traceback
@@ -41,22 +316,19 @@ class Database:
 
     def create_table_if_not_exists(self):
         """Creates the model_results table if it does not exist."""
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS model_results (
-            id SERIAL PRIMARY KEY,
-            accuracy FLOAT,
-            loss FLOAT,
-            model_name VARCHAR(255)
-        );
-        """
         try:
-            print("Ensuring table 'model_results' exists...")
-            self.cursor.execute(create_table_query)
-            self.connection.commit()
+            self.ensure_table("model_results")
             print("Table 'model_results' is ready.")
         except Exception as e:
             print(f"Error creating table: {e}")
-            self.connection.rollback()
+
+    def create_cv_table_if_not_exists(self):
+        """Creates the cv_results table for per-fold cross-validation metrics if it does not exist."""
+        try:
+            self.ensure_table("cv_results")
+            print("Table 'cv_results' is ready.")
+        except Exception as e:
+            print(f"Error creating table: {e}")
 
     def execute_query(self, query: str, params: tuple = None):
         """
@@ -72,7 +344,7 @@ class Database:
             print(f"Executing query: {query}")
             if params:
                 print(f"With parameters: {params}")
-            self.cursor.execute(query, params)
+            self.cursor.execute(self._sql(query), params or ())
             self.connection.commit()
             print("Query executed successfully.")
         except Exception as e:
@@ -93,17 +365,21 @@ class Database:
             return []
         try:
             print(f"Fetching data with query: {query}")
-            self.cursor.execute(query, params)
+            self.cursor.execute(self._sql(query), params or ())
             return self.cursor.fetchall()
         except Exception as e:
             print(f"Error fetching data: {e}")
             return []
 
     def close(self):
-        """Close the database connection and cursor."""
+        """Return the borrowed connection and close the pool."""
         if self.cursor:
             self.cursor.close()
-            print("Cursor closed.")
+            self.cursor = None
         if self.connection:
-            self.connection.close()
-            print("Database connection closed.")
\ No newline at end of file
+            self.pool.putconn(self.connection)
+            self.connection = None
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+            print("Database connection closed.")
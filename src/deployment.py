@@ -4,14 +4,43 @@ Deployment Module using FastAPI.
 This module creates a REST API to serve predictions from the trained model.
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, root_validator
 import mlflow.sklearn
-import pandas as pd
+import numpy as np
 from src.utils import load_config
+from src.batching import MicroBatcher
+from src.database import Database
+from src.monitoring import MetricsRegistry
+from src.prediction_logger import PredictionLogger
+from src.prediction_cache import PredictionCache
+from src.model_loader import LoadedModel, ModelWatcher, load_latest_model, load_model
 
-# Initialize FastAPI app
-app = FastAPI(title="Wine Quality Prediction API")
+# Request and prediction metrics, exposed in the Prometheus text format on /metrics
+metrics_registry = MetricsRegistry()
+requests_total = metrics_registry.counter(
+    "http_requests_total", "HTTP requests by method, path and status code.", ("method", "path", "status"))
+request_duration = metrics_registry.histogram(
+    "http_request_duration_seconds", "End-to-end request latency.", ("method", "path"))
+stage_duration = metrics_registry.histogram(
+    "prediction_stage_duration_seconds",
+    "Time per stage of the prediction path: validation, features, predict and serialization.", ("endpoint", "stage"))
+errors_total = metrics_registry.counter(
+    "http_request_errors_total", "Requests that raised an unhandled exception.", ("path",))
+predictions_total = metrics_registry.counter(
+    "predictions_total", "Predicted rows by endpoint and source (model or cache).", ("endpoint", "source"))
 
 # Define request model
 class WineData(BaseModel):
@@ -27,30 +56,468 @@ class WineData(BaseModel):
     sulphates: float
     alcohol: float
 
-# Load configuration and model at startup
-config = load_config("configs/config.yaml")
-mlflow.set_tracking_uri(config["mlflow"]["tracking_uri"])
-# For simplicity, load the latest model from MLflow
-import mlflow
-client = mlflow.tracking.MlflowClient()
-runs = client.search_runs(experiment_ids=["0"], order_by=["start_time DESC"], max_results=1)
-if runs:
-    run_id = runs[0].info.run_id
-    model = mlflow.sklearn.load_model(f"runs:/{run_id}/model")
-else:
-    model = None
+# Request fields in the order of the feature transform's input columns (features.RAW_COLUMNS)
+FEATURE_FIELDS = list(WineData.__fields__)
+
+# Define batch request model: either a list of records or a columnar payload
+class WineBatch(BaseModel):
+    records: Optional[List[WineData]] = None
+    columns: Optional[Dict[str, List[float]]] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_payload(cls, values):
+        records, columns = values.get("records"), values.get("columns")
+        if (records is None) == (columns is None):
+            raise ValueError("Provide exactly one of 'records' or 'columns'")
+        if columns is not None:
+            missing = [field for field in FEATURE_FIELDS if field not in columns]
+            if missing:
+                raise ValueError(f"Missing columns: {missing}")
+            lengths = {len(columns[field]) for field in FEATURE_FIELDS}
+            if len(lengths) != 1:
+                raise ValueError("All columns must have the same length")
+        return values
+
+    def __len__(self) -> int:
+        if self.records is not None:
+            return len(self.records)
+        return len(self.columns[FEATURE_FIELDS[0]])
+
+# Service state. Nothing is loaded at import time: the lifespan handler reads the
+# configuration and sets everything up once per worker process.
+CONFIG_PATH = os.environ.get("WINE_CONFIG", "configs/config.yaml")
+config = None
+inference_engine = None
+active_model = None
+model_load_task = None
+model_load_error = None
+inference_executor = None
+prediction_cache = None
+batcher = None
+watcher = None
+prediction_logger = None
+
+# Worker processes of the process executor, and how long a new pool may take to load a model
+inference_workers = 0
+warm_timeout_seconds = 60.0
+# Serializes executor swaps on reload with shutdown
+_executor_lock = threading.Lock()
+
+# Models of the inference worker processes, by run id, least recently used first (process executor only).
+# The previous model is kept next to the current one for requests still in flight during a reload.
+WORKER_MODELS = 2
+_worker_config = None
+_worker_models = OrderedDict()
+
+def get_active_model() -> Optional[LoadedModel]:
+    return active_model
+
+def set_active_model(loaded: Optional[LoadedModel]):
+    """
+    Swap in a new model. A single reference assignment, so requests see either the old or the new model.
+
+    With worker processes the model is first loaded by a fresh pool (see start_process_executor)
+    while the current pool keeps serving; both are swapped in once every new worker is ready,
+    and the old pool shuts down after its queued requests. Blocks until then, so call it off
+    the event loop.
+    """
+    global active_model, inference_executor
+    previous = inference_executor
+    if not isinstance(previous, ProcessPoolExecutor) or loaded is None or loaded.source == "manual":
+        active_model = loaded
+        return
+    executor = start_process_executor(loaded.run_id)
+    with _executor_lock:
+        if inference_executor is not previous:
+            # Stopped (or swapped by another reload) while the new workers were loading
+            executor.shutdown(wait=False, cancel_futures=True)
+            return
+        inference_executor, active_model = executor, loaded
+    previous.shutdown(wait=False)
+
+def build_input_matrix(batch: WineBatch, dtype=np.float64) -> np.ndarray:
+    """
+    Fill a preallocated matrix of the raw measurements of a batch request, in FEATURE_FIELDS order.
+
+    Pass the model's transform dtype, so the matrix is not cast again before predicting.
+    """
+    X = np.empty((len(batch), len(FEATURE_FIELDS)), dtype=dtype)
+    if batch.records is not None:
+        for i, record in enumerate(batch.records):
+            X[i] = [getattr(record, field) for field in FEATURE_FIELDS]
+    else:
+        for j, field in enumerate(FEATURE_FIELDS):
+            X[:, j] = batch.columns[field]
+    return X
+
+def build_input_row(wine_data: WineData, dtype=np.float64) -> np.ndarray:
+    """Raw measurements of a single request, matching build_input_matrix."""
+    return np.array([getattr(wine_data, field) for field in FEATURE_FIELDS], dtype=dtype)
+
+def _init_inference_worker(worker_config: dict, run_id: Optional[str]):
+    """Process pool initializer: load the model of run_id before the worker takes its first task."""
+    global _worker_config
+    _worker_config = worker_config
+    mlflow.set_tracking_uri(worker_config["mlflow"]["tracking_uri"])
+    if run_id is not None:
+        _worker_model(run_id)
+
+def _worker_model(run_id: str) -> LoadedModel:
+    loaded = _worker_models.get(run_id)
+    if loaded is None:
+        loaded = _worker_models[run_id] = load_model(_worker_config, run_id)
+        while len(_worker_models) > WORKER_MODELS:
+            _worker_models.popitem(last=False)
+    _worker_models.move_to_end(run_id)
+    return loaded
+
+def _worker_state() -> tuple:
+    """Process id and loaded run ids of an inference worker."""
+    return os.getpid(), list(_worker_models)
+
+def predict_in_worker(run_id: str, features: np.ndarray) -> np.ndarray:
+    """Predict in an inference worker process, loading the model of run_id if it isn't loaded yet."""
+    return _worker_model(run_id).model.predict(features)
+
+def start_process_executor(run_id: Optional[str]) -> ProcessPoolExecutor:
+    """
+    Start a pool of inference_workers spawned processes that load the model of run_id up front.
+
+    Returns once every worker has run its initializer and answered a task, or after
+    warm_timeout_seconds (the remaining workers then finish loading on their own).
+    """
+    executor = ProcessPoolExecutor(max_workers=inference_workers, mp_context=mp.get_context("spawn"),
+                                   initializer=_init_inference_worker, initargs=(config, run_id))
+    # While no worker is idle every submission spawns one, so the first round starts all of them;
+    # a worker only answers after its initializer, and fast ones may answer twice, so ask again
+    deadline = time.monotonic() + warm_timeout_seconds
+    ready = set()
+    try:
+        while len(ready) < inference_workers:
+            futures = [executor.submit(_worker_state) for _ in range(inference_workers - len(ready))]
+            for future in futures:
+                ready.add(future.result(timeout=max(deadline - time.monotonic(), 0.0))[0])
+    except FutureTimeoutError:
+        print(f"Inference workers not ready after {warm_timeout_seconds}s ({len(ready)}/{inference_workers})")
+    return executor
+
+async def run_inference(current: LoadedModel, features: np.ndarray) -> np.ndarray:
+    """
+    Run the CPU-bound model.predict off the event loop, on the inference executor.
+
+    Worker processes load the model by run id; models set by hand (source "manual")
+    only exist in this process and are predicted on its default thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    if isinstance(inference_executor, ProcessPoolExecutor):
+        if current.source != "manual":
+            return await loop.run_in_executor(inference_executor, predict_in_worker, current.run_id, features)
+        return await loop.run_in_executor(None, current.model.predict, features)
+    return await loop.run_in_executor(inference_executor, current.model.predict, features)
+
+async def predict_matrix(X: np.ndarray, current: LoadedModel) -> np.ndarray:
+    """
+    Run a model and its feature transform on raw rows (a micro-batch of /predict calls).
+
+    current is the model the requests captured, not the active one at flush time, so
+    their results are cached and logged under the model that produced them.
+    """
+    with stage_duration.time(endpoint="/predict", stage="features"):
+        features = current.transform.transform(X)
+    with stage_duration.time(endpoint="/predict", stage="predict"):
+        return await run_inference(current, features)
+
+def start_inference_executor(executor_config: dict):
+    """Create the executor model.predict runs on: a thread pool or, for full CPU parallelism, worker processes."""
+    global inference_executor, inference_workers, warm_timeout_seconds
+    executor_type = executor_config.get("type", "thread")
+    max_workers = executor_config.get("max_workers")
+    if executor_type == "thread":
+        inference_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+    elif executor_type == "process":
+        # Spawned workers only import this module, which loads nothing, and then load the model once;
+        # without a model yet they are started by the first set_active_model
+        inference_workers = max_workers or os.cpu_count()
+        warm_timeout_seconds = executor_config.get("warm_timeout_seconds", 60.0)
+        current = active_model
+        if current is not None and current.source != "manual":
+            inference_executor = start_process_executor(current.run_id)
+        else:
+            inference_executor = ProcessPoolExecutor(max_workers=inference_workers, mp_context=mp.get_context("spawn"),
+                                                     initializer=_init_inference_worker, initargs=(config, None))
+    else:
+        raise ValueError(f"Unknown inference executor: {executor_type}")
+
+def stop_inference_executor():
+    global inference_executor
+    with _executor_lock:
+        executor, inference_executor = inference_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+async def load_initial_model():
+    """Load the latest model off the event loop, then start watching for newer ones."""
+    global model_load_error
+    try:
+        # A model set before startup (tests, embedding) is kept
+        if active_model is None:
+            # The flat engine memory-maps the exported artifact, so workers share its pages;
+            # otherwise (or without an export) the latest model is loaded from MLflow
+            loop = asyncio.get_running_loop()
+            loaded = await loop.run_in_executor(None, load_latest_model, config)
+            if loaded is not None and active_model is None:
+                # Worker processes load the model before it is served
+                await loop.run_in_executor(None, set_active_model, loaded)
+    except Exception as e:
+        model_load_error = str(e)
+        print(f"Error loading model: {e}")
+    # Also started without a model, to pick up the first one trained
+    start_model_watcher(config.get("deployment", {}).get("model_reload", {}))
+
+async def start_batcher(batching_config: dict):
+    """Group concurrent single-record /predict calls into shared predict batches."""
+    global batcher
+    if batching_config.get("enabled", False):
+        batcher = MicroBatcher(
+            predict_matrix,
+            n_features=len(FEATURE_FIELDS),
+            max_batch_size=batching_config.get("max_batch_size", 64),
+            max_wait_ms=batching_config.get("max_wait_ms", 5.0),
+        )
+        await batcher.start()
+
+async def stop_batcher():
+    global batcher
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+
+def start_model_watcher(reload_config: dict):
+    """Reload newly trained models in the background."""
+    global watcher
+    if reload_config.get("enabled", False):
+        watcher = ModelWatcher(config, get_active_model, set_active_model,
+                               interval_seconds=reload_config.get("interval_seconds", 30))
+        watcher.start()
+
+def stop_model_watcher():
+    global watcher
+    if watcher is not None:
+        watcher.stop()
+        watcher = None
+
+def start_prediction_logger(logging_config: dict):
+    """Persist served predictions to the database from a background thread."""
+    global prediction_logger
+    if logging_config.get("enabled", False):
+        database_config = dict(logging_config.get("database", {}))
+        database_config.setdefault("password", os.environ.get("POSTGRES_PASSWORD"))
+        prediction_logger = PredictionLogger(
+            Database(**database_config),
+            max_queue_size=logging_config.get("max_queue_size", 10000),
+            batch_size=logging_config.get("batch_size", 500),
+            flush_interval_seconds=logging_config.get("flush_interval_seconds", 1.0),
+            use_copy=logging_config.get("use_copy", False),
+        )
+        prediction_logger.start()
+
+def stop_prediction_logger():
+    global prediction_logger
+    if prediction_logger is not None:
+        prediction_logger.stop()
+        prediction_logger.database.close()
+        prediction_logger = None
+
+def create_prediction_cache(cache_config: dict) -> Optional[PredictionCache]:
+    """Cache of /predict results for repeated inputs, if enabled."""
+    if not cache_config.get("enabled", False):
+        return None
+    return PredictionCache(
+        max_size=cache_config.get("max_size", 10000),
+        ttl_seconds=cache_config.get("ttl_seconds"),
+        quantization=cache_config.get("quantization", 1e-6),
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Set up the service when a worker process starts and release it on shutdown.
+
+    The model loads in the background: the server accepts requests immediately,
+    /health answers at once and /ready turns 200 when a model is available.
+    """
+    global config, inference_engine, prediction_cache, model_load_task
+    if config is None:
+        config = load_config(CONFIG_PATH)
+    deployment_config = config.get("deployment", {})
+    inference_engine = deployment_config.get("inference_engine", "sklearn")
+    if inference_engine not in ("flat", "sklearn"):
+        raise ValueError(f"Unknown inference engine: {inference_engine}")
+    mlflow.set_tracking_uri(config["mlflow"]["tracking_uri"])
+
+    start_inference_executor(deployment_config.get("inference_executor", {}))
+    if prediction_cache is None:
+        prediction_cache = create_prediction_cache(deployment_config.get("prediction_cache", {}))
+    model_load_task = asyncio.create_task(load_initial_model())
+    await start_batcher(deployment_config.get("micro_batching", {}))
+    start_prediction_logger(deployment_config.get("prediction_logging", {}))
+    try:
+        yield
+    finally:
+        await stop_batcher()
+        if not model_load_task.done():
+            model_load_task.cancel()
+        stop_model_watcher()
+        stop_prediction_logger()
+        stop_inference_executor()
+
+# Initialize FastAPI app; all startup and shutdown work happens in the lifespan handler
+app = FastAPI(title="Wine Quality Prediction API")
+app.router.lifespan_context = lifespan
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    # Read by the endpoints to time request parsing and validation
+    request.state.start = start
+    # Unknown paths share one label, so scans cannot grow the metric series
+    path = request.url.path if request.url.path in route_paths else "other"
+    try:
+        response = await call_next(request)
+    except Exception:
+        errors_total.inc(path=path)
+        requests_total.inc(method=request.method, path=path, status=500)
+        raise
+    end = time.perf_counter()
+    handler_end = getattr(request.state, "handler_end", None)
+    if handler_end is not None:
+        stage_duration.observe(end - handler_end, endpoint=path, stage="serialization")
+    requests_total.inc(method=request.method, path=path, status=response.status_code)
+    request_duration.observe(end - start, method=request.method, path=path)
+    return response
+
+def observe_validation(request: Request, endpoint: str):
+    """Record the time from receiving the request to entering the endpoint (parsing and validation)."""
+    start = getattr(request.state, "start", None)
+    if start is not None:
+        stage_duration.observe(time.perf_counter() - start, endpoint=endpoint, stage="validation")
+
+def finish_request(request: Request, response: dict) -> dict:
+    """Mark the end of the endpoint; the middleware attributes the rest to response serialization."""
+    request.state.handler_end = time.perf_counter()
+    return response
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Wine Quality Prediction API!"}
 
+# Liveness and readiness run on the event loop, so they answer while the model loads
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    current = active_model
+    if current is None:
+        loading = model_load_task is not None and not model_load_task.done()
+        return JSONResponse(status_code=503, content={"ready": False, "loading": loading, "error": model_load_error})
+    return {"ready": True, "run_id": current.run_id}
+
+@app.get("/metrics")
+def metrics():
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/predict")
-def predict(wine_data: WineData):
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not available")
-    
-    # Convert input data to DataFrame
-    data = pd.DataFrame([wine_data.dict()])
-    # Ensure column names match those used in training (adjust if needed)
-    prediction = model.predict(data)[0]
-    return {"predicted_quality": prediction}
\ No newline at end of file
+async def predict(wine_data: WineData, request: Request):
+    observe_validation(request, "/predict")
+    start = time.perf_counter()
+    current = active_model
+    if current is None:
+        raise HTTPException(status_code=503, detail="Model not available")
+
+    row = build_input_row(wine_data, current.transform.dtype)
+
+    # Repeated inputs are answered from the cache without touching the model
+    if prediction_cache is not None:
+        cached = prediction_cache.get(row, current)
+        if cached is not None:
+            predictions_total.inc(endpoint="/predict", source="cache")
+            log_prediction("predict", current, wine_data.dict(), cached, start)
+            return finish_request(request, {"predicted_quality": cached})
+
+    # Queue the record for a shared vectorized predict call
+    if batcher is not None:
+        predicted_quality = await batcher.submit(row, current)
+    else:
+        with stage_duration.time(endpoint="/predict", stage="features"):
+            features = current.transform.transform(row[np.newaxis, :])
+        with stage_duration.time(endpoint="/predict", stage="predict"):
+            predicted_quality = float((await run_inference(current, features))[0])
+
+    if prediction_cache is not None:
+        prediction_cache.put(row, current, predicted_quality)
+    predictions_total.inc(endpoint="/predict", source="model")
+    log_prediction("predict", current, wine_data.dict(), predicted_quality, start)
+    return finish_request(request, {"predicted_quality": predicted_quality})
+
+def log_prediction(endpoint: str, current: LoadedModel, features: dict, predicted_quality: float, start: float):
+    """Queue a served prediction for the database; never blocks the request."""
+    if prediction_logger is not None:
+        prediction_logger.log(endpoint, current.run_id, features, predicted_quality,
+                              (time.perf_counter() - start) * 1000.0)
+
+def build_batch_features(batch: WineBatch, current: LoadedModel) -> tuple:
+    """Raw input matrix and model features of a batch request."""
+    X = build_input_matrix(batch, current.transform.dtype)
+    return X, current.transform.transform(X)
+
+@app.post("/predict/batch")
+async def predict_batch(batch: WineBatch, request: Request):
+    observe_validation(request, "/predict/batch")
+    start = time.perf_counter()
+    current = active_model
+    if current is None:
+        raise HTTPException(status_code=503, detail="Model not available")
+
+    # One vectorized transform and predict call for the whole batch; building the matrix loops
+    # over the records, so it runs on the default thread pool like the predict call
+    loop = asyncio.get_running_loop()
+    with stage_duration.time(endpoint="/predict/batch", stage="features"):
+        X, features = await loop.run_in_executor(None, build_batch_features, batch, current)
+    with stage_duration.time(endpoint="/predict/batch", stage="predict"):
+        predictions = await run_inference(current, features) if len(X) else np.empty(0)
+    predictions_total.inc(len(predictions), endpoint="/predict/batch", source="model")
+    if prediction_logger is not None:
+        # One queue entry for the batch; the writer thread expands and serializes the rows
+        prediction_logger.log_batch("batch", current.run_id, FEATURE_FIELDS, X, predictions,
+                                    (time.perf_counter() - start) * 1000.0)
+    return finish_request(request, {"predicted_quality": predictions.tolist(), "count": len(predictions)})
+
+@app.get("/predict/batching")
+def batching_stats():
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+@app.get("/predict/cache")
+def cache_stats():
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
+
+@app.get("/predict/logging")
+def logging_stats():
+    if prediction_logger is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_logger.stats()}
+
+@app.get("/model")
+def model_info():
+    current = active_model
+    if current is None:
+        raise HTTPException(status_code=503, detail="Model not available")
+    return {"inference_engine": inference_engine, **current.describe()}
+
+# Paths labelled individually in the request metrics
+route_paths = {route.path for route in app.routes}
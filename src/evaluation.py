@@ -5,7 +5,11 @@ This module loads the trained model from MLflow, evaluates it on a test set,
 and generates evaluation metrics and plots.
 """
 
+import atexit
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import mlflow
 import mlflow.sklearn
@@ -13,88 +17,153 @@ import matplotlib
 matplotlib.use("Agg")  # Set Matplotlib to non-GUI backend to avoid Tkinter issues
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.model_selection import train_test_split
-from src.utils import load_config
-
-
-def evaluate_model(model, X_test, y_test):
-    """Evaluates the model, generates plots, and logs metrics to MLflow."""
+from src.metrics import RegressionMetrics
+from src.profiling import profile_stage
+from src.utils import load_config, read_processed_data
+
+
+# Background process pool for plot rendering (created on first use)
+_plot_executor = None
+
+def plot_actual_vs_predicted(y_test, predictions, path: str):
+    """Scatter plot of actual vs predicted quality."""
+    plt.figure(figsize=(8, 6))
+    plt.scatter(y_test, predictions, alpha=0.7)
+    plt.xlabel("Actual Quality")
+    plt.ylabel("Predicted Quality")
+    plt.title("Actual vs Predicted Wine Quality")
+    plt.savefig(path)
+    plt.close()
+
+def plot_residuals(residuals, path: str):
+    """Histogram with KDE of the residuals."""
+    plt.figure(figsize=(8, 6))
+    sns.histplot(residuals, bins=20, kde=True)
+    plt.xlabel("Residuals")
+    plt.ylabel("Frequency")
+    plt.title("Residual Distribution")
+    plt.savefig(path)
+    plt.close()
+
+def plot_feature_importance(feature_importance: pd.Series, path: str):
+    """Bar chart of the feature importances, largest first."""
+    plt.figure(figsize=(10, 6))
+    feature_importance.sort_values(ascending=False).plot(kind="bar")
+    plt.xlabel("Feature")
+    plt.ylabel("Importance")
+    plt.title("Feature Importance")
+    plt.savefig(path)
+    plt.close()
+
+def render_evaluation_plots(run_id: str, tracking_uri: str, y_test, predictions,
+                            feature_importance: pd.Series = None, output_dir: str = "data/processed/evaluation_plots"):
+    """
+    Renders the evaluation plots and uploads them as artifacts of the given MLflow run.
+    
+    Takes only plain arrays and identifiers, so it can run in a separate process
+    after the run itself has ended.
+    """
+    mlflow.set_tracking_uri(tracking_uri)
+    client = mlflow.tracking.MlflowClient()
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Plot 1: Actual vs Predicted
+    plot_path_1 = os.path.join(output_dir, "actual_vs_predicted.png")
+    with profile_stage("plot_actual_vs_predicted", run_id):
+        plot_actual_vs_predicted(y_test, predictions, plot_path_1)
+        client.log_artifact(run_id, plot_path_1)
+
+    # Plot 2: Residual Plot
+    plot_path_2 = os.path.join(output_dir, "residual_distribution.png")
+    with profile_stage("plot_residual_distribution", run_id):
+        plot_residuals(y_test - predictions, plot_path_2)
+        client.log_artifact(run_id, plot_path_2)
+
+    # Plot 3: Feature Importance (only if model supports it)
+    if feature_importance is not None:
+        plot_path_3 = os.path.join(output_dir, "feature_importance.png")
+        with profile_stage("plot_feature_importance", run_id):
+            plot_feature_importance(feature_importance, plot_path_3)
+            client.log_artifact(run_id, plot_path_3)
+
+    print(f"Evaluation plots stored in MLflow run {run_id}.")
+
+def _report_plot_failure(future):
+    """Done-callback of a background plot render: print why it failed, since nobody waits for it."""
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Error rendering evaluation plots: {future.exception()}")
+
+def wait_for_plots():
+    """Blocks until all plots submitted in the background are rendered and uploaded."""
+    global _plot_executor
+    if _plot_executor is not None:
+        _plot_executor.shutdown(wait=True)
+        _plot_executor = None
+
+def evaluate_model(model, X_test, y_test, async_plots: bool = False,
+                   plot_dir: str = "data/processed/evaluation_plots"):
+    """
+    Evaluates the model, generates plots, and logs metrics to MLflow.
+    
+    Metrics are logged right away. With async_plots=True the plots are rendered and
+    uploaded by a background process and the returned Future completes once they
+    are stored; otherwise they are rendered before returning and None is returned.
+    """
     
     # Ensure to end any previous active run before starting a new one
     if mlflow.active_run():
         mlflow.end_run()
 
     # Start a new MLflow run
-    with mlflow.start_run():
+    with mlflow.start_run() as run:
         # Make predictions
         predictions = model.predict(X_test)
 
-        # Calculate evaluation metrics
-        mse = mean_squared_error(y_test, predictions)
-        rmse = mean_squared_error(y_test, predictions)**0.5  # Wurzel des MSE
-        mae = mean_absolute_error(y_test, predictions)
-        r2 = r2_score(y_test, predictions)
+        # Calculate evaluation metrics in a single pass
+        metrics = RegressionMetrics().update(y_test, predictions).result()
+        mse, rmse, mae, r2 = metrics["MSE"], metrics["RMSE"], metrics["MAE"], metrics["R²"]
 
         print(f"Evaluation Results:\nMSE: {mse}\nRMSE: {rmse}\nMAE: {mae}\nR²: {r2}")
 
         # Log metrics to MLflow
-        mlflow.log_metric("MSE", mse)
-        mlflow.log_metric("RMSE", rmse)
-        mlflow.log_metric("MAE", mae)
-        mlflow.log_metric("R²", r2)
-
-        # Ensure output directory exists
-        output_dir = "data/processed/evaluation_plots"
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Plot 1: Actual vs Predicted
-        plt.figure(figsize=(8, 6))
-        plt.scatter(y_test, predictions, alpha=0.7)
-        plt.xlabel("Actual Quality")
-        plt.ylabel("Predicted Quality")
-        plt.title("Actual vs Predicted Wine Quality")
-        plot_path_1 = os.path.join(output_dir, "actual_vs_predicted.png")
-        plt.savefig(plot_path_1)
-        plt.close()
-        mlflow.log_artifact(plot_path_1)
-
-        # Plot 2: Residual Plot
-        residuals = y_test - predictions
-        plt.figure(figsize=(8, 6))
-        sns.histplot(residuals, bins=20, kde=True)
-        plt.xlabel("Residuals")
-        plt.ylabel("Frequency")
-        plt.title("Residual Distribution")
-        plot_path_2 = os.path.join(output_dir, "residual_distribution.png")
-        plt.savefig(plot_path_2)
-        plt.close()
-        mlflow.log_artifact(plot_path_2)
-
-        # Plot 3: Feature Importance (only if model supports it)
+        mlflow.log_metrics({name: value for name, value in metrics.items() if name not in ("n", "per_class")})
+        for quality, class_metrics in metrics["per_class"].items():
+            mlflow.log_metric(f"MAE_quality_{quality}", class_metrics["MAE"])
+            mlflow.log_metric(f"RMSE_quality_{quality}", class_metrics["RMSE"])
+
+        feature_importance = None
         if hasattr(model, "feature_importances_"):
-            plt.figure(figsize=(10, 6))
             feature_importance = pd.Series(model.feature_importances_, index=X_test.columns)
-            feature_importance.sort_values(ascending=False).plot(kind="bar")
-            plt.xlabel("Feature")
-            plt.ylabel("Importance")
-            plt.title("Feature Importance")
-            plot_path_3 = os.path.join(output_dir, "feature_importance.png")
-            plt.savefig(plot_path_3)
-            plt.close()
-            mlflow.log_artifact(plot_path_3)
-
+        plot_args = (run.info.run_id, mlflow.get_tracking_uri(), np.asarray(y_test), np.asarray(predictions),
+                     feature_importance, plot_dir)
+
+        if async_plots:
+            # Plotting and KDE dominate evaluation time; render them off the training path
+            global _plot_executor
+            if _plot_executor is None:
+                _plot_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+                # Pending plots are finished before the process exits
+                atexit.register(wait_for_plots)
+            print("Evaluation metrics logged; rendering plots in the background.")
+            future = _plot_executor.submit(render_evaluation_plots, *plot_args)
+            future.add_done_callback(_report_plot_failure)
+            return future
+
+        render_evaluation_plots(*plot_args)
         print("Evaluation complete. Results and plots stored in MLflow.")
 
 
 if __name__ == "__main__":
     config = load_config("configs/config.yaml")
     data_path = config["data"]["processed_path"]
+    data_format = config["data"].get("processed_format", "csv")
+    features = config["model"].get("features")
     test_size = config["model"]["test_size"]
     random_state = config["model"]["random_state"]
 
     # Load processed data
-    data = pd.read_csv(data_path)
+    data = read_processed_data(data_path, data_format, features + ["quality"] if features else None)
     X = data.drop("quality", axis=1)
     y = data["quality"]
 
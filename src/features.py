@@ -0,0 +1,184 @@
+"""
+Feature Transform Module.
+
+This module compiles the feature construction of the pipeline (mapping input
+columns to model features, derived features such as 'acidity_ratio' and an
+optional standardization) into index arrays that are applied to NumPy
+matrices with a few vectorized operations. The transform is fitted during
+training and saved with the model, so training, the API and batch scoring
+build exactly the same features.
+"""
+
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+# Raw measurements of the wine dataset, in file order
+RAW_COLUMNS = [
+    "fixed acidity", "volatile acidity", "citric acid", "residual sugar", "chlorides", "free sulfur dioxide",
+    "total sulfur dioxide", "density", "pH", "sulphates", "alcohol",
+]
+# Derived features as numerator / (denominator + RATIO_EPSILON), as in data_preprocessing.add_engineered_features
+RATIO_FEATURES = {"acidity_ratio": ("fixed acidity", "volatile acidity")}
+RATIO_EPSILON = 1e-5
+# Features of a model trained on the full processed data
+DEFAULT_FEATURES = RAW_COLUMNS + list(RATIO_FEATURES)
+TRANSFORM_FILE = "transform.json"
+
+
+def field_name(column: str) -> str:
+    """API field name of a dataset column ("fixed acidity" -> "fixed_acidity")."""
+    return column.replace(" ", "_")
+
+
+def model_feature_names(model) -> Optional[list]:
+    """Training column names of a FlatForest or a fitted sklearn model, if known."""
+    names = getattr(model, "feature_names", None)
+    if names is None and hasattr(model, "feature_names_in_"):
+        names = list(model.feature_names_in_)
+    return [str(name) for name in names] if names is not None else None
+
+
+class FeatureTransform:
+    def __init__(self, feature_names: Optional[List[str]] = None, input_columns: Optional[List[str]] = None,
+                 standardize: bool = False, mean: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None,
+                 dtype: str = "float64"):
+        """
+        Initialize the transform from input rows to model features.
+
+        :param feature_names: Model features in column order: input columns or keys of RATIO_FEATURES.
+        :param input_columns: Columns of the input matrices (defaults to RAW_COLUMNS).
+        :param standardize: Standardize the features with the mean and scale learned by fit.
+        :param mean: Fitted feature means (set by fit or when loading).
+        :param scale: Fitted feature standard deviations (set by fit or when loading).
+        :param dtype: dtype of the feature matrices, "float64" or "float32" (the dtype the trees are built on,
+            so sklearn and FlatForest use float32 matrices without casting them).
+        """
+        self.feature_names = list(feature_names or DEFAULT_FEATURES)
+        self.input_columns = list(input_columns or RAW_COLUMNS)
+        self.standardize = standardize
+        self.dtype = np.dtype(dtype)
+        self.mean = None if mean is None else np.asarray(mean, dtype=self.dtype)
+        self.scale = None if scale is None else np.asarray(scale, dtype=self.dtype)
+        self._compile()
+
+    def _compile(self):
+        """Resolve every feature to input column positions once, so transform only does array operations."""
+        position = {column: i for i, column in enumerate(self.input_columns)}
+        copies, ratios = [], []
+        for j, name in enumerate(self.feature_names):
+            if name in position:
+                copies.append((j, position[name]))
+            elif name in RATIO_FEATURES:
+                missing = [column for column in RATIO_FEATURES[name] if column not in position]
+                if missing:
+                    raise ValueError(f"Feature '{name}' needs the input columns {missing}")
+                ratios.append((j, position[RATIO_FEATURES[name][0]], position[RATIO_FEATURES[name][1]]))
+            else:
+                raise ValueError(f"Unknown feature '{name}'")
+
+        self._copy_out, self._copy_in = np.array(copies, dtype=np.intp).reshape(-1, 2).T
+        self._ratio_out, self._ratio_num, self._ratio_den = np.array(ratios, dtype=np.intp).reshape(-1, 3).T
+        used = set(self._copy_in) | set(self._ratio_num) | set(self._ratio_den)
+        self.used_columns = [column for i, column in enumerate(self.input_columns) if i in used]
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    @property
+    def input_fields(self) -> List[str]:
+        """API field names of the input columns, in input order."""
+        return [field_name(column) for column in self.input_columns]
+
+    def fit(self, X: np.ndarray):
+        """Learn the standardization of the features of X (input rows); a no-op without standardize."""
+        if self.standardize:
+            scaler = StandardScaler().fit(self._build(self._check(X)))
+            self.mean, self.scale = scaler.mean_.astype(self.dtype), scaler.scale_.astype(self.dtype)
+        return self
+
+    def transform(self, X: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Build the model features of a matrix of input rows.
+
+        :param X: Array of shape (n_rows, len(input_columns)), columns in input_columns order.
+        :param out: Optional preallocated array of shape (n_rows, n_features) and the transform's dtype.
+        :return: Feature matrix of shape (n_rows, n_features) and the transform's dtype.
+        """
+        out = self._build(self._check(X), out)
+        if self.standardize:
+            if self.mean is None:
+                raise ValueError("FeatureTransform must be fitted before transform when standardize is set")
+            out -= self.mean
+            out /= self.scale
+        return out
+
+    def _check(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=self.dtype)
+        if X.ndim != 2 or X.shape[1] != len(self.input_columns):
+            raise ValueError(f"Expected input of shape (n_rows, {len(self.input_columns)}), got {X.shape}")
+        return X
+
+    def _build(self, X: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        if out is None:
+            out = np.empty((X.shape[0], self.n_features), dtype=self.dtype)
+        out[:, self._copy_out] = X[:, self._copy_in]
+        if len(self._ratio_out):
+            out[:, self._ratio_out] = X[:, self._ratio_num] / (X[:, self._ratio_den] + RATIO_EPSILON)
+        return out
+
+    def input_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Input matrix of a DataFrame with dataset ("fixed acidity") or API ("fixed_acidity") column names.
+
+        Input columns the features don't use may be missing and are left as NaN.
+        """
+        df = df.rename(columns={field_name(column): column for column in self.input_columns})
+        missing = [column for column in self.used_columns if column not in df.columns]
+        if missing:
+            raise ValueError(f"Missing input columns: {missing}")
+        return df.reindex(columns=self.input_columns).to_numpy(dtype=self.dtype)
+
+    def transform_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Build the model features of a DataFrame of input rows, see input_matrix."""
+        return self.transform(self.input_matrix(df))
+
+    def to_dict(self) -> dict:
+        return {
+            "feature_names": self.feature_names,
+            "input_columns": self.input_columns,
+            "standardize": self.standardize,
+            "mean": None if self.mean is None else self.mean.tolist(),
+            "scale": None if self.scale is None else self.scale.tolist(),
+            "dtype": self.dtype.name,
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict):
+        return cls(values["feature_names"], values["input_columns"], values.get("standardize", False),
+                   values.get("mean"), values.get("scale"), values.get("dtype", "float64"))
+
+    @classmethod
+    def for_model(cls, model):
+        """Unstandardized transform for a model saved without one, built from its training column names."""
+        return cls(model_feature_names(model))
+
+    def save(self, directory: str):
+        """Write the transform as transform.json into directory."""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, TRANSFORM_FILE), "w") as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, directory: str):
+        """Read a transform written by save, or return None if directory has none."""
+        path = os.path.join(directory, TRANSFORM_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as file:
+            return cls.from_dict(json.load(file))
@@ -0,0 +1,236 @@
+"""
+Inference Module.
+
+This module flattens a fitted tree ensemble into contiguous node arrays, stores
+them as a self-contained artifact of .npy files and evaluates them without
+sklearn. Loading memory-maps the arrays, so every API worker process shares the
+same model pages through the OS page cache instead of unpickling its own copy.
+"""
+
+import json
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+
+# Node arrays of the structure-of-arrays layout and their on-disk dtypes
+NODE_ARRAYS = {
+    "feature": np.int32,
+    "threshold": np.float64,
+    "left": np.int32,
+    "right": np.int32,
+    "value": np.float64,
+    "missing_left": np.bool_,
+}
+LATEST_FILE = "LATEST"
+META_FILE = "meta.json"
+FORMAT_VERSION = 2
+# Version 1 artifacts lack missing_left and sent missing values to the right child
+SUPPORTED_VERSIONS = (1, 2)
+# Upper bound on simultaneously traversed (tree, row) pairs per predict block
+MAX_LANES = 1 << 20
+
+
+class FlatForest:
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, value: np.ndarray, roots: np.ndarray,
+                 n_features: int, feature_names: Optional[List[str]] = None, run_id: Optional[str] = None,
+                 missing_left: Optional[np.ndarray] = None):
+        """
+        Initialize the forest from flattened node arrays.
+
+        All trees are concatenated into one node table. Child indices are global
+        positions in that table and leaves have left == right == -1.
+
+        :param feature: Split feature of each node.
+        :param threshold: Split threshold of each node (go left if x <= threshold).
+        :param left: Global index of the left child of each node.
+        :param right: Global index of the right child of each node.
+        :param value: Prediction stored at each node (used at leaves).
+        :param roots: Global index of the root node of each tree, in ensemble order.
+        :param n_features: Number of input features.
+        :param feature_names: Training column names, if known.
+        :param run_id: MLflow run the forest was trained in, if known.
+        :param missing_left: Whether a missing (NaN) feature value goes to the left child of each
+            node, as decided by sklearn when fitting (defaults to always right).
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.n_features = n_features
+        self.feature_names = feature_names
+        self.run_id = run_id
+        self.missing_left = np.zeros(len(feature), dtype=np.bool_) if missing_left is None else missing_left
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model, feature_names: Optional[List[str]] = None, run_id: Optional[str] = None):
+        """
+        Flatten a fitted single-output sklearn forest (e.g. RandomForestRegressor).
+
+        :param model: Fitted ensemble exposing estimators_ with a tree_ attribute.
+        :param feature_names: Training column names (defaults to model.feature_names_in_).
+        :param run_id: MLflow run id stored alongside the arrays.
+        :return: A FlatForest producing the same predictions as model.predict.
+        """
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError("Only single-output forests can be flattened.")
+
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        arrays = {name: [] for name in NODE_ARRAYS}
+        for tree, offset in zip(trees, offsets[:-1]):
+            is_leaf = tree.children_left < 0
+            arrays["feature"].append(np.where(is_leaf, 0, tree.feature))
+            arrays["threshold"].append(tree.threshold)
+            arrays["left"].append(np.where(is_leaf, -1, tree.children_left + offset))
+            arrays["right"].append(np.where(is_leaf, -1, tree.children_right + offset))
+            arrays["value"].append(tree.value[:, 0, 0])
+            arrays["missing_left"].append(tree.missing_go_to_left.astype(np.bool_))
+
+        if feature_names is None and hasattr(model, "feature_names_in_"):
+            feature_names = [str(name) for name in model.feature_names_in_]
+        flat = {name: np.ascontiguousarray(np.concatenate(parts), dtype=NODE_ARRAYS[name])
+                for name, parts in arrays.items()}
+        return cls(roots=offsets[:-1].astype(np.int64), n_features=int(model.n_features_in_),
+                   feature_names=feature_names, run_id=run_id, **flat)
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predict with the flattened forest.
+
+        All trees are traversed together: each (tree, row) pair is a lane in one
+        flat node-index array, and every iteration advances all lanes that have
+        not reached a leaf by one level with a few gathers. Rows are processed
+        in blocks so the lane arrays stay bounded for large batches.
+
+        Like sklearn, features are compared as float32 values, missing (NaN) values
+        follow the direction each split learned during fitting, and the per-tree
+        predictions are summed in ensemble order before dividing by the number
+        of trees, so the results are bit-identical to the sklearn forest.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a 2-D array with {self.n_features} features.")
+
+        predictions = np.empty(X.shape[0], dtype=np.float64)
+        block_size = max(1, MAX_LANES // self.n_trees)
+        for start in range(0, X.shape[0], block_size):
+            stop = min(start + block_size, X.shape[0])
+            predictions[start:stop] = self._predict_block(X[start:stop])
+        return predictions
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows = X.shape[0]
+        # Lanes are tree-major: lane t * n_rows + i evaluates tree t on row i
+        node = np.repeat(np.asarray(self.roots, dtype=np.int64), n_rows)
+        row = np.tile(np.arange(n_rows), self.n_trees)
+        X_flat = X.ravel()
+
+        active = np.flatnonzero(self.left[node] >= 0)
+        while len(active):
+            current = node[active]
+            values = X_flat[row[active] * self.n_features + self.feature[current]]
+            go_left = (values <= self.threshold[current]) | (np.isnan(values) & self.missing_left[current])
+            current = np.where(go_left, self.left[current], self.right[current])
+            node[active] = current
+            active = active[self.left[current] >= 0]
+
+        leaf_values = self.value[node].reshape(self.n_trees, n_rows)
+        total = np.zeros(n_rows, dtype=np.float64)
+        for tree_values in leaf_values:
+            total += tree_values
+        return total / self.n_trees
+
+    def save(self, directory: str):
+        """Write the node arrays as .npy files plus a meta.json into directory."""
+        os.makedirs(directory, exist_ok=True)
+        for name in NODE_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(directory, "roots.npy"), self.roots)
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "n_trees": self.n_trees,
+            "n_features": self.n_features,
+            "feature_names": self.feature_names,
+            "run_id": self.run_id,
+            "created_at": time.time(),
+        }
+        with open(os.path.join(directory, META_FILE), "w") as file:
+            json.dump(meta, file)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """
+        Open a forest written by save.
+
+        :param directory: Directory containing the .npy files and meta.json.
+        :param mmap: Memory-map the arrays read-only instead of reading them into memory.
+        """
+        with open(os.path.join(directory, META_FILE), "r") as file:
+            meta = json.load(file)
+        if meta.get("format_version") not in SUPPORTED_VERSIONS:
+            raise ValueError(f"Unsupported model artifact version: {meta.get('format_version')}")
+
+        mmap_mode = "r" if mmap else None
+        names = [name for name in list(NODE_ARRAYS) + ["roots"]
+                 if name != "missing_left" or meta["format_version"] >= 2]
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+        return cls(n_features=meta["n_features"], feature_names=meta["feature_names"],
+                   run_id=meta["run_id"], **arrays)
+
+
+def export_model_artifact(model, export_dir: str, run_id: str, feature_names: Optional[List[str]] = None,
+                          transform=None) -> str:
+    """
+    Flatten a trained model into export_dir/<run_id> and mark it as the latest export.
+
+    The LATEST pointer file is replaced atomically, so readers either see the
+    previous complete artifact or the new one.
+
+    Args:
+        model: The fitted sklearn forest.
+        export_dir (str): Root directory of the exported artifacts.
+        run_id (str): MLflow run id, used as the artifact directory name.
+        feature_names (list): Training column names.
+        transform (FeatureTransform): Fitted feature transform, saved next to the node arrays.
+
+    Returns:
+        str: The directory the artifact was written to.
+    """
+    artifact_dir = os.path.join(export_dir, run_id)
+    FlatForest.from_sklearn(model, feature_names=feature_names, run_id=run_id).save(artifact_dir)
+    if transform is not None:
+        transform.save(artifact_dir)
+
+    tmp_path = os.path.join(export_dir, f".{LATEST_FILE}.tmp")
+    with open(tmp_path, "w") as file:
+        file.write(run_id)
+    os.replace(tmp_path, os.path.join(export_dir, LATEST_FILE))
+    return artifact_dir
+
+
+def latest_artifact_dir(export_dir: str) -> Optional[str]:
+    """Return the directory of the latest exported artifact, or None if nothing was exported."""
+    latest_path = os.path.join(export_dir, LATEST_FILE)
+    if not os.path.exists(latest_path):
+        return None
+    with open(latest_path, "r") as file:
+        run_id = file.read().strip()
+    artifact_dir = os.path.join(export_dir, run_id)
+    return artifact_dir if os.path.exists(os.path.join(artifact_dir, META_FILE)) else None
+
+
+def load_model_artifact(export_dir: str) -> Optional[FlatForest]:
+    """Memory-map the latest exported artifact, or return None if nothing was exported."""
+    artifact_dir = latest_artifact_dir(export_dir)
+    if artifact_dir is None:
+        return None
+    return FlatForest.load(artifact_dir)
@@ -0,0 +1,175 @@
+"""
+Regression Metrics Module.
+
+This module computes the evaluation metrics of the pipeline (MSE, RMSE, MAE, R²,
+residual quantiles and per-quality-class errors) in a single vectorized pass.
+Predictions can be accumulated chunk by chunk, so evaluation does not need to
+hold every prediction in memory.
+"""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+RESIDUAL_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class RegressionMetrics:
+    def __init__(self, residual_range: float = 10.0, bin_width: float = 0.001):
+        """
+        Initialize an empty accumulator.
+
+        Residual quantiles come from a fixed-width histogram, so they are exact to
+        within bin_width; residuals outside +/- residual_range fall into the edge bins.
+
+        :param residual_range: Largest absolute residual resolved by the histogram.
+        :param bin_width: Width of a histogram bin.
+        """
+        self.residual_range = residual_range
+        self.bin_width = bin_width
+        self.n = 0
+        self.sum_squared_error = 0.0
+        self.sum_absolute_error = 0.0
+        # Mean and sum of squared deviations of y_true, merged chunk by chunk for R²
+        self.y_mean = 0.0
+        self.y_m2 = 0.0
+        self.residual_counts = np.zeros(int(round(2 * residual_range / bin_width)), dtype=np.int64)
+        # Per-class accumulators, indexed by the rounded true quality
+        self.class_counts = np.zeros(0, dtype=np.int64)
+        self.class_squared_error = np.zeros(0)
+        self.class_absolute_error = np.zeros(0)
+
+    def update(self, y_true, y_pred) -> "RegressionMetrics":
+        """
+        Add a chunk of targets and predictions.
+
+        :param y_true: True quality values.
+        :param y_pred: Predicted quality values.
+        :return: self, so updates can be chained.
+        """
+        y_true = np.asarray(y_true, dtype=np.float64).ravel()
+        y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+        if y_true.shape != y_pred.shape:
+            raise ValueError(f"y_true and y_pred differ in length: {len(y_true)} != {len(y_pred)}")
+        n = len(y_true)
+        if n == 0:
+            return self
+
+        residuals = y_true - y_pred
+        squared = residuals * residuals
+        absolute = np.abs(residuals)
+        self.sum_squared_error += float(squared.sum())
+        self.sum_absolute_error += float(absolute.sum())
+
+        # Chan et al. parallel update of the mean and M2 of y_true
+        chunk_mean = float(y_true.mean())
+        chunk_m2 = float(((y_true - chunk_mean) ** 2).sum())
+        self._merge_moments(n, chunk_mean, chunk_m2)
+
+        # Residual histogram
+        bins = np.floor((residuals + self.residual_range) / self.bin_width).astype(np.int64)
+        np.clip(bins, 0, len(self.residual_counts) - 1, out=bins)
+        self.residual_counts += np.bincount(bins, minlength=len(self.residual_counts))
+
+        # Per-class errors
+        classes = np.clip(np.rint(y_true), 0, None).astype(np.int64)
+        size = max(len(self.class_counts), int(classes.max()) + 1)
+        self._grow_classes(size)
+        self.class_counts += np.bincount(classes, minlength=size)
+        self.class_squared_error += np.bincount(classes, weights=squared, minlength=size)
+        self.class_absolute_error += np.bincount(classes, weights=absolute, minlength=size)
+        return self
+
+    def merge(self, other: "RegressionMetrics") -> "RegressionMetrics":
+        """Combine the accumulator of another chunk or worker into this one."""
+        if (other.residual_range, other.bin_width) != (self.residual_range, self.bin_width):
+            raise ValueError("Cannot merge metrics with different residual histograms")
+        if other.n == 0:
+            return self
+        self.sum_squared_error += other.sum_squared_error
+        self.sum_absolute_error += other.sum_absolute_error
+        self._merge_moments(other.n, other.y_mean, other.y_m2)
+        self.residual_counts += other.residual_counts
+        size = max(len(self.class_counts), len(other.class_counts))
+        self._grow_classes(size)
+        other_size = len(other.class_counts)
+        self.class_counts[:other_size] += other.class_counts
+        self.class_squared_error[:other_size] += other.class_squared_error
+        self.class_absolute_error[:other_size] += other.class_absolute_error
+        return self
+
+    def _merge_moments(self, n: int, mean: float, m2: float):
+        total = self.n + n
+        delta = mean - self.y_mean
+        self.y_mean += delta * n / total
+        self.y_m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+
+    def _grow_classes(self, size: int):
+        grow = size - len(self.class_counts)
+        if grow > 0:
+            self.class_counts = np.concatenate([self.class_counts, np.zeros(grow, dtype=np.int64)])
+            self.class_squared_error = np.concatenate([self.class_squared_error, np.zeros(grow)])
+            self.class_absolute_error = np.concatenate([self.class_absolute_error, np.zeros(grow)])
+
+    def residual_quantile(self, q: float) -> float:
+        """Return the q-quantile of the residuals (y_true - y_pred), interpolated within a histogram bin."""
+        if self.n == 0:
+            return float("nan")
+        cumulative = np.cumsum(self.residual_counts)
+        target = q * self.n
+        index = int(np.searchsorted(cumulative, target))
+        index = min(index, len(cumulative) - 1)
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (target - before) / self.residual_counts[index] if self.residual_counts[index] else 0.0
+        return float(-self.residual_range + (index + fraction) * self.bin_width)
+
+    def result(self) -> dict:
+        """
+        Return the metrics accumulated so far.
+
+        :return: {"MSE", "RMSE", "MAE", "R²", "residual_pXX" for each of RESIDUAL_QUANTILES,
+            "n", "per_class": {quality: {"n", "MSE", "RMSE", "MAE"}}}.
+        """
+        if self.n == 0:
+            raise ValueError("No predictions have been accumulated")
+        mse = self.sum_squared_error / self.n
+        metrics = {
+            "MSE": mse,
+            "RMSE": mse ** 0.5,
+            "MAE": self.sum_absolute_error / self.n,
+            # Same convention as sklearn's r2_score for a constant target
+            "R²": 1.0 - self.sum_squared_error / self.y_m2 if self.y_m2 > 0 else (1.0 if mse == 0 else 0.0),
+            "n": self.n,
+        }
+        for q in RESIDUAL_QUANTILES:
+            metrics[f"residual_p{int(round(q * 100)):02d}"] = self.residual_quantile(q)
+
+        per_class = {}
+        for quality in np.flatnonzero(self.class_counts):
+            count = int(self.class_counts[quality])
+            class_mse = float(self.class_squared_error[quality]) / count
+            per_class[int(quality)] = {
+                "n": count,
+                "MSE": class_mse,
+                "RMSE": class_mse ** 0.5,
+                "MAE": float(self.class_absolute_error[quality]) / count,
+            }
+        metrics["per_class"] = per_class
+        return metrics
+
+
+def evaluate_chunks(model, chunks: Iterable[Tuple[object, object]],
+                    metrics: Optional[RegressionMetrics] = None) -> RegressionMetrics:
+    """
+    Predict and accumulate metrics chunk by chunk, e.g. over pd.read_csv(..., chunksize=...).
+
+    :param model: Any model with a predict method.
+    :param chunks: Iterable of (X, y) chunks.
+    :param metrics: Accumulator to add to (a new one by default).
+    :return: The accumulator; only one chunk of predictions is held in memory at a time.
+    """
+    metrics = metrics if metrics is not None else RegressionMetrics()
+    for X, y in chunks:
+        metrics.update(y, model.predict(X))
+    return metrics
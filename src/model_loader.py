@@ -0,0 +1,158 @@
+"""
+Model Loading Module.
+
+This module locates the newest trained model (exported flat artifact or MLflow
+run), loads it, and provides a background watcher that swaps in newer models
+without restarting the prediction service.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import mlflow
+import mlflow.sklearn
+
+from src.features import TRANSFORM_FILE, FeatureTransform
+from src.inference import FlatForest, latest_artifact_dir
+
+
+class LoadedModel:
+    def __init__(self, model, run_id: Optional[str], source: str, load_seconds: float = 0.0,
+                 transform: Optional[FeatureTransform] = None):
+        """
+        A model together with where it came from and when it was loaded.
+
+        :param model: Object exposing predict(X).
+        :param run_id: MLflow run id the model was trained in.
+        :param source: "artifact", "mlflow" or "manual".
+        :param load_seconds: Time spent loading the model.
+        :param transform: Feature transform the model was trained with (defaults to the unstandardized
+            transform of its training columns).
+        """
+        self.model = model
+        self.transform = transform or FeatureTransform.for_model(model)
+        self.run_id = run_id
+        self.source = source
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def describe(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "source": self.source,
+            "model_type": type(self.model).__name__,
+            "loaded_at": self.loaded_at.isoformat(),
+            "load_seconds": self.load_seconds,
+            "features": self.transform.feature_names,
+            "standardized": self.transform.standardize,
+        }
+
+
+def latest_model_version(config: dict) -> Optional[str]:
+    """
+    Return the run id of the newest available model without loading it.
+
+    With the "flat" inference engine the exported artifact's LATEST pointer is
+    checked first; otherwise (or if nothing was exported) the newest MLflow run.
+    """
+    if config["deployment"].get("inference_engine", "sklearn") == "flat":
+        artifact_dir = latest_artifact_dir(config["model"]["export_dir"])
+        if artifact_dir is not None:
+            return os.path.basename(artifact_dir)
+
+    client = mlflow.tracking.MlflowClient()
+    # Only training runs log a model; evaluation and profiling runs don't
+    runs = client.search_runs(experiment_ids=["0"], filter_string="params.n_rows_trained != ''",
+                              order_by=["start_time DESC"], max_results=1)
+    return runs[0].info.run_id if runs else None
+
+
+def load_model(config: dict, run_id: str) -> LoadedModel:
+    """
+    Load the model of the given run for the configured inference engine.
+
+    The flat engine memory-maps the exported artifact if there is one for this
+    run and otherwise flattens the MLflow model after loading it.
+    """
+    start = time.perf_counter()
+    inference_engine = config["deployment"].get("inference_engine", "sklearn")
+    artifact_dir = os.path.join(config["model"]["export_dir"], run_id)
+
+    if inference_engine == "flat" and os.path.exists(artifact_dir):
+        model, source = FlatForest.load(artifact_dir), "artifact"
+        transform = FeatureTransform.load(artifact_dir)
+    else:
+        model, source = mlflow.sklearn.load_model(f"runs:/{run_id}/model"), "mlflow"
+        transform = load_run_transform(run_id)
+        if inference_engine == "flat":
+            model = FlatForest.from_sklearn(model, run_id=run_id)
+    return LoadedModel(model, run_id, source, time.perf_counter() - start, transform)
+
+
+def load_run_transform(run_id: str) -> Optional[FeatureTransform]:
+    """Load the feature transform logged by a training run, or None for runs that predate it."""
+    try:
+        return FeatureTransform.from_dict(mlflow.artifacts.load_dict(f"runs:/{run_id}/{TRANSFORM_FILE}"))
+    except Exception:
+        return None
+
+
+def load_latest_model(config: dict) -> Optional[LoadedModel]:
+    """Load the newest available model, or return None if there is none."""
+    run_id = latest_model_version(config)
+    return load_model(config, run_id) if run_id is not None else None
+
+
+class ModelWatcher(threading.Thread):
+    def __init__(self, config: dict, get_current: Callable[[], Optional[LoadedModel]],
+                 on_new_model: Callable[[LoadedModel], None], interval_seconds: float = 30.0):
+        """
+        Background thread that polls for a newer model and hands it over once loaded.
+
+        Loading happens entirely on this thread; on_new_model only receives a
+        fully loaded model, so requests never wait for a reload.
+
+        :param config: Pipeline configuration.
+        :param get_current: Returns the currently active model.
+        :param on_new_model: Called with the newly loaded model to swap it in.
+        :param interval_seconds: Seconds between checks.
+        """
+        super().__init__(name="model-watcher", daemon=True)
+        self.config = config
+        self.get_current = get_current
+        self.on_new_model = on_new_model
+        self.interval_seconds = interval_seconds
+        self.failed_versions = set()
+        self._stop_event = threading.Event()
+
+    def check_once(self) -> bool:
+        """Load and hand over a newer model if one exists. Returns True if a model was swapped in."""
+        version = latest_model_version(self.config)
+        current = self.get_current()
+        if version is None or version in self.failed_versions:
+            return False
+        if current is not None and current.run_id == version:
+            return False
+        try:
+            loaded = load_model(self.config, version)
+        except Exception as e:
+            # Don't retry a broken run on every poll
+            print(f"Error loading model from run {version}: {e}")
+            self.failed_versions.add(version)
+            return False
+        self.on_new_model(loaded)
+        print(f"Loaded model from run {version} ({loaded.source}) in {loaded.load_seconds:.3f}s")
+        return True
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"Error checking for a new model: {e}")
+
+    def stop(self):
+        self._stop_event.set()
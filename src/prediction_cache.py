@@ -0,0 +1,101 @@
+"""
+Prediction Cache Module.
+
+This module caches predictions keyed on quantized feature vectors, so repeated
+requests skip model inference entirely.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+
+class PredictionCache:
+    def __init__(self, max_size: int = 10000, ttl_seconds: Optional[float] = None, quantization: float = 1e-6):
+        """
+        Initialize an LRU cache of predictions.
+
+        :param max_size: Maximum number of cached predictions; the least recently used is evicted first.
+        :param ttl_seconds: Lifetime of an entry in seconds (None keeps entries until evicted).
+        :param quantization: Step features are rounded to before hashing; inputs closer than this share an entry.
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        if quantization <= 0:
+            raise ValueError("quantization must be positive")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.quantization = quantization
+        self.entries = OrderedDict()
+        self.model_version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def key(self, features: np.ndarray) -> bytes:
+        """Quantize a feature vector and return a hashable key."""
+        return np.rint(np.asarray(features, dtype=np.float64) / self.quantization).astype(np.int64).tobytes()
+
+    def _check_version(self, model_version: Any):
+        # Entries computed by a previous model are stale once a new model is active
+        if model_version != self.model_version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.model_version = model_version
+
+    def get(self, features: np.ndarray, model_version: Any) -> Optional[float]:
+        """
+        Look up the prediction for a feature vector.
+
+        :param features: 1-D feature vector.
+        :param model_version: Identifies the active model; a change clears the cache.
+        :return: The cached prediction, or None on a miss.
+        """
+        key = self.key(features)
+        with self.lock:
+            self._check_version(model_version)
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and entry[1] <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, features: np.ndarray, model_version: Any, prediction: float):
+        """Store the prediction of a feature vector computed by the given model."""
+        key = self.key(features)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self.lock:
+            self._check_version(model_version)
+            self.entries[key] = (prediction, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
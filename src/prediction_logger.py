@@ -0,0 +1,193 @@
+"""
+Prediction Logger Module.
+
+This module persists served predictions for monitoring without adding a
+database round trip to the request path. Records go into a bounded in-memory
+queue and a background thread writes them to the prediction_logs table in
+bulk batches through the pooled Database. A batch request is queued as a
+single entry and expanded into rows by the writer thread, which also does the
+JSON serialization.
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from src.database import Database
+
+COLUMNS = ("created_at", "endpoint", "run_id", "features", "predicted_quality", "latency_ms")
+
+# Wakes the writer thread for shutdown
+_STOP = object()
+
+
+class _BatchEntry(NamedTuple):
+    """Predictions of one batch request, expanded into rows by the writer thread."""
+    created_at: datetime
+    endpoint: str
+    run_id: Optional[str]
+    feature_names: Sequence[str]
+    X: np.ndarray
+    predictions: np.ndarray
+    latency_ms: float
+
+
+class PredictionLogger:
+    def __init__(self, database: Database, max_queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval_seconds: float = 1.0, block_timeout: Optional[float] = None,
+                 use_copy: bool = False):
+        """
+        Initialize the logger.
+
+        :param database: Database the records are written to.
+        :param max_queue_size: Entries (records or batches) held in memory before new ones are dropped.
+        :param batch_size: Records written per insert.
+        :param flush_interval_seconds: Longest time a record waits for its batch to fill.
+        :param block_timeout: If set, a full queue makes log wait up to this many seconds
+            (backpressure) before dropping; otherwise records are dropped immediately.
+        :param use_copy: Write batches with COPY instead of executemany (Postgres only).
+        """
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.block_timeout = block_timeout
+        self.use_copy = use_copy
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.logged = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        """Start the background writer thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prediction-logger", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush the queued records and stop the writer thread."""
+        if self._thread is None:
+            return
+        # The sentinel must get in even when the queue is full, so wait for space
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def log(self, endpoint: str, run_id: Optional[str], features: dict, predicted_quality: float,
+            latency_ms: float) -> bool:
+        """
+        Queue one prediction record.
+
+        :return: False if the queue was full and the record was dropped.
+        """
+        record = (datetime.now(timezone.utc), endpoint, run_id, features, float(predicted_quality), float(latency_ms))
+        return self._put(record, 1)
+
+    def log_batch(self, endpoint: str, run_id: Optional[str], feature_names: Sequence[str], X: np.ndarray,
+                  predictions: np.ndarray, latency_ms: float) -> bool:
+        """
+        Queue the predictions of a batch request as one entry.
+
+        :param feature_names: Names of the columns of X, the keys of each row's logged features.
+        :param X: Input rows, one per prediction; must not be modified afterwards.
+        :return: False if the queue was full and the batch was dropped.
+        """
+        entry = _BatchEntry(datetime.now(timezone.utc), endpoint, run_id, feature_names, X, predictions,
+                            float(latency_ms))
+        return self._put(entry, len(predictions))
+
+    def _put(self, entry, n_records: int) -> bool:
+        try:
+            if self.block_timeout:
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += n_records
+            return False
+        with self._lock:
+            self.logged += n_records
+        return True
+
+    @staticmethod
+    def _rows(entry) -> list:
+        """Database rows of a queued record or batch entry."""
+        if isinstance(entry, _BatchEntry):
+            return [(entry.created_at, entry.endpoint, entry.run_id, json.dumps(dict(zip(entry.feature_names, row))),
+                     predicted_quality, entry.latency_ms)
+                    for row, predicted_quality in zip(entry.X.tolist(), entry.predictions.tolist())]
+        created_at, endpoint, run_id, features, predicted_quality, latency_ms = entry
+        return [(created_at, endpoint, run_id, json.dumps(features), predicted_quality, latency_ms)]
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                # Drain what is left before exiting
+                while True:
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is not _STOP:
+                        batch.extend(self._rows(record))
+                for start in range(0, len(batch), self.batch_size):
+                    self._flush(batch[start:start + self.batch_size])
+                return
+
+            if record is not None:
+                batch.extend(self._rows(record))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval_seconds
+            # A batch entry can fill several inserts at once
+            while len(batch) >= self.batch_size:
+                self._flush(batch[:self.batch_size])
+                batch = batch[self.batch_size:]
+            if not batch:
+                deadline = None
+            elif time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, batch: list):
+        if not batch:
+            return
+        try:
+            self.database.insert_many("prediction_logs", COLUMNS, batch, use_copy=self.use_copy)
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            # Monitoring must not take down serving: count the lost records and carry on
+            print(f"Error writing prediction logs: {e}")
+            with self._lock:
+                self.failed += len(batch)
+
+    def stats(self) -> dict:
+        """Return queue depth and record counters."""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "logged": self.logged,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
@@ -0,0 +1,183 @@
+"""
+Profiling Module.
+
+This module measures the wall time, CPU time and peak resident memory of
+pipeline stages and logs them as MLflow metrics. The peak of a stage is
+sampled by a background thread while the stage runs; the process-wide
+high-water mark is logged next to it. Setting the WINE_PROFILE
+environment variable to a directory additionally writes a cProfile dump of
+every stage there (open them with snakeviz or pstats).
+
+Stages running in other processes (Dask workers, the evaluation plot pool) log
+to the run named by MLFLOW_RUN_ID, see profiling_run.
+"""
+
+import cProfile
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import mlflow
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILE_ENV = "WINE_PROFILE"
+# Seconds between resident memory samples taken during a stage
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Only the outermost stage of a thread is run under cProfile
+_local = threading.local()
+
+
+def max_rss_mb() -> Optional[float]:
+    """High-water mark of the resident set size of this process over its lifetime, in MB."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # ru_maxrss is in KB on Linux
+
+
+def current_rss_mb() -> Optional[float]:
+    """Current resident set size of this process in MB, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+
+
+class _RssSampler(threading.Thread):
+    """Track the largest resident set size seen between start and stop."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self) -> Optional[float]:
+        """Stop sampling and return the peak in MB (None where RSS can't be read)."""
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+        self._sample()
+        return self.peak
+
+
+def _run_id(run_id: Optional[str]) -> Optional[str]:
+    if run_id is not None:
+        return run_id
+    active = mlflow.active_run()
+    if active is not None:
+        return active.info.run_id
+    return os.environ.get("MLFLOW_RUN_ID")
+
+
+def log_stage(record: dict, run_id: Optional[str] = None):
+    """Print a stage record and log it to the given, active or MLFLOW_RUN_ID run."""
+    stage = record["stage"]
+    print(f"[profile] {stage}: wall {record['wall_seconds']:.3f}s, cpu {record['cpu_seconds']:.3f}s, "
+          f"peak rss {record['peak_rss_mb']} MB (process max {record['max_rss_mb']} MB)")
+    run_id = _run_id(run_id)
+    if run_id is None:
+        return
+    try:
+        client = mlflow.tracking.MlflowClient()
+        timestamp = int(time.time() * 1000)
+        for name in ("wall_seconds", "cpu_seconds", "peak_rss_mb", "max_rss_mb"):
+            if record[name] is not None:
+                client.log_metric(run_id, f"{stage}_{name}", record[name], timestamp=timestamp)
+    except Exception as e:
+        print(f"Error logging profile of stage {stage}: {e}")
+
+
+@contextmanager
+def profile_stage(stage: str, run_id: Optional[str] = None):
+    """
+    Measure a block of code as one pipeline stage.
+
+    CPU time is that of the whole process, so it includes other threads working at the same time.
+    peak_rss_mb is the largest resident memory sampled during the block; max_rss_mb is the
+    high-water mark of the process, which may have been reached before the stage.
+
+    :param stage: Stage name, used as the MLflow metric prefix and the dump file name.
+    :param run_id: MLflow run to log to (defaults to the active run, then MLFLOW_RUN_ID).
+    :return: The stage record, filled in when the block exits.
+    """
+    profile_dir = os.environ.get(PROFILE_ENV)
+    profiler = None
+    if profile_dir and not getattr(_local, "profiling", False):
+        profiler = cProfile.Profile()
+        _local.profiling = True
+
+    record = {"stage": stage}
+    sampler = _RssSampler()
+    sampler.start()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(profile_dir, f"{stage}-{os.getpid()}-{int(time.time() * 1000)}.prof"))
+        record.update({
+            "wall_seconds": time.perf_counter() - wall_start,
+            "cpu_seconds": time.process_time() - cpu_start,
+            "peak_rss_mb": sampler.stop(),
+            "max_rss_mb": max_rss_mb(),
+        })
+        log_stage(record, run_id)
+
+
+def profiled(stage: Optional[str] = None):
+    """Decorator running every call of a function as a profiled stage (named after the function by default)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile_stage(stage or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profiling_run(run_name: str, tracking_uri: Optional[str] = None):
+    """
+    Start an MLflow run that stages in worker processes started inside the block log to.
+
+    The run id and tracking URI are exported as MLFLOW_RUN_ID / MLFLOW_TRACKING_URI,
+    which processes spawned afterwards (e.g. a local Dask cluster) inherit.
+    """
+    if tracking_uri:
+        mlflow.set_tracking_uri(tracking_uri)
+    previous = {name: os.environ.get(name) for name in ("MLFLOW_RUN_ID", "MLFLOW_TRACKING_URI")}
+    with mlflow.start_run(run_name=run_name) as run:
+        os.environ["MLFLOW_RUN_ID"] = run.info.run_id
+        os.environ["MLFLOW_TRACKING_URI"] = mlflow.get_tracking_uri()
+        try:
+            yield run
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
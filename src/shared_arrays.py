@@ -0,0 +1,73 @@
+"""
+Shared Array Module.
+
+This module places NumPy arrays in shared memory so that worker processes can
+read the training data without each receiving a pickled copy.
+"""
+
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Shared memory segments attached by this (worker) process, kept open while the arrays are in use
+_attached: List[shared_memory.SharedMemory] = []
+# Arrays attached by init_worker
+_worker_arrays: Dict[str, np.ndarray] = {}
+
+
+def share_arrays(**arrays: np.ndarray) -> Tuple[dict, List[shared_memory.SharedMemory]]:
+    """
+    Copy arrays into new shared memory segments.
+
+    The caller owns the returned segments and must close and unlink them (see
+    release_arrays) once the workers are done.
+
+    :param arrays: Arrays to share, by name.
+    :return: (picklable specs to pass to attach_arrays, the shared memory segments).
+    """
+    specs, segments = {}, []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        specs[name] = (segment.name, array.shape, array.dtype.str)
+        segments.append(segment)
+    return specs, segments
+
+
+def attach_arrays(specs: dict) -> Dict[str, np.ndarray]:
+    """
+    Map arrays created by share_arrays into this process without copying.
+
+    The arrays are read-only views; the segments stay attached for the lifetime of the process.
+
+    :param specs: Specs returned by share_arrays.
+    :return: The arrays, by name.
+    """
+    arrays = {}
+    for name, (segment_name, shape, dtype) in specs.items():
+        segment = shared_memory.SharedMemory(name=segment_name)
+        _attached.append(segment)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+        array.flags.writeable = False
+        arrays[name] = array
+    return arrays
+
+
+def init_worker(specs: dict):
+    """Process pool initializer: attach the shared arrays once per worker process."""
+    _worker_arrays.clear()
+    _worker_arrays.update(attach_arrays(specs))
+
+
+def worker_arrays() -> Dict[str, np.ndarray]:
+    """Return the arrays attached by init_worker in this worker process."""
+    return _worker_arrays
+
+
+def release_arrays(segments: List[shared_memory.SharedMemory]):
+    """Close and unlink segments created by share_arrays."""
+    for segment in segments:
+        segment.close()
+        segment.unlink()
@@ -0,0 +1,113 @@
+"""
+Stage Cache Module.
+
+This module stores the outputs of pipeline stages on local disk, keyed on a
+content hash of their inputs and the version of the code that produced them,
+so unchanged stages can be skipped on the next run.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+
+# Bump to invalidate every cached stage output, e.g. after a pandas upgrade
+CACHE_VERSION = "1"
+
+
+class StageCache:
+    def __init__(self, cache_dir: str):
+        """
+        Initialize the cache.
+
+        :param cache_dir: Directory holding the cached stage outputs and the manifest.
+        """
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def code_version(fn: Callable) -> str:
+        """Hash the source code of a stage function, so editing it invalidates its outputs."""
+        return hashlib.sha256(inspect.getsource(fn).encode()).hexdigest()
+
+    @staticmethod
+    def key(stage: str, *parts: str) -> str:
+        """Combine a stage name and the hashes it depends on into a cache key."""
+        digest = hashlib.sha256(CACHE_VERSION.encode())
+        for part in (stage,) + parts:
+            digest.update(b"\0" + str(part).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_file(path: str, prefix_size: Optional[int] = None, block_size: int = 1 << 20) -> Tuple[str, Optional[str]]:
+        """
+        Hash the content of a file in one streaming pass.
+
+        :param path: File to hash.
+        :param prefix_size: Also return the hash of the first prefix_size bytes.
+        :param block_size: Read size in bytes.
+        :return: (hash of the whole file, hash of the prefix or None).
+        """
+        digest = hashlib.sha256()
+        prefix_hash = None
+        position = 0
+        with open(path, "rb") as file:
+            while True:
+                # Stop a read exactly at the prefix boundary to snapshot the prefix hash
+                size = block_size
+                if prefix_size is not None and position < prefix_size:
+                    size = min(block_size, prefix_size - position)
+                block = file.read(size)
+                if not block:
+                    break
+                digest.update(block)
+                position += len(block)
+                if position == prefix_size:
+                    prefix_hash = digest.copy().hexdigest()
+        if prefix_size == 0:
+            prefix_hash = hashlib.sha256().hexdigest()
+        return digest.hexdigest(), prefix_hash
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{stage}-{key}.pkl")
+
+    def load(self, stage: str, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached output of a stage, or None if it has not been computed for this key."""
+        path = self._path(stage, key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pd.read_pickle(path)
+
+    def save(self, stage: str, key: str, df: pd.DataFrame):
+        """Store the output of a stage. Written to a temporary file first, so readers never see partial outputs."""
+        path = self._path(stage, key)
+        tmp_path = f"{path}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    def read_manifest(self, source: str) -> Optional[dict]:
+        """Return what was recorded about a source file on the previous run."""
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, "r") as file:
+            return json.load(file).get(os.path.abspath(source))
+
+    def write_manifest(self, source: str, record: dict):
+        """Record the state of a source file after a run."""
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as file:
+                manifest = json.load(file)
+        manifest[os.path.abspath(source)] = record
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
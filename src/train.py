@@ -1,46 +1,252 @@
+import json
+import os
+import tempfile
 import pandas as pd
 import numpy as np
 import mlflow
 import mlflow.sklearn
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
-from src.utils import load_config
+from src.utils import load_config, read_processed_data
 from prefect import flow, task
 from src.database import Database  # Using the Database class
 from src.evaluation import evaluate_model  # Import evaluate_model Function from evaluation.py
+from src.features import TRANSFORM_FILE, FeatureTransform
+from src.inference import export_model_artifact
+from src.metrics import RegressionMetrics
+from src.model_loader import load_run_transform
+from src.profiling import profile_stage
+from src.tuning import parameter_candidates, run_search
+from src.cross_validation import FOLD_METRICS, cross_validate_parallel, summarize_folds
 
-# Function to store model results in the database
-def store_model_results_to_db(model_name: str, train_score: float, test_score: float):
-    try:
-        # Initialize the database connection
-        db = Database(dbname='wine_quality', user='postgres', password='Bubble69$')
-        db.connect()
-        
-        # Ensure the table exists
-        db.create_table_if_not_exists()
+# Artifact with the test row positions of a training run
+TEST_ROWS_FILE = "test_rows.npy"
 
-        # SQL query to store the results in the 'model_results' table
-        insert_query = """
-        INSERT INTO model_results (accuracy, loss, model_name)
-        VALUES (%s, %s, %s);
-        """
-        params = (train_score, test_score, model_name)
-        print(f"Executing query: {insert_query} with parameters: {params}")
-        db.execute_query(insert_query, params)
+# Pooled results database, created on first use and shared by all writes of this process
+_database = None
 
-        # Optional: Fetch results from DB to ensure they were stored
-        fetched_results = db.fetch_all("SELECT * FROM model_results;")
-        print("Stored results:", fetched_results)
+def get_database() -> Database:
+    """Return the pooled connection to the results database."""
+    global _database
+    if _database is None:
+        _database = Database(dbname='wine_quality', user='postgres', password='Bubble69$')
+    return _database
 
-        db.close()
+# Function to store model results in the database
+def store_model_results_to_db(model_name: str, train_score: float, test_score: float, run_id: str = None,
+                              hyperparameters: dict = None, metrics: dict = None):
+    try:
+        metrics = metrics or {}
+        row = (train_score, test_score, model_name, run_id,
+               json.dumps(hyperparameters, default=str) if hyperparameters is not None else None,
+               metrics.get("MSE"), metrics.get("RMSE"), metrics.get("MAE"), metrics.get("R²"))
+        # One transaction on a pooled connection; the table is checked once per process
+        rows = get_database().insert_many(
+            "model_results",
+            ("accuracy", "loss", "model_name", "run_id", "hyperparameters", "mse", "rmse", "mae", "r2"),
+            [row])
+        print(f"Stored {rows} row(s) in model_results.")
 
     except Exception as e:
         print(f"Error storing results to DB: {e}")
 
+# Function to store per-fold cross-validation metrics in the database
+def store_cv_results_to_db(run_id: str, model_name: str, folds: list):
+    try:
+        rows = [(run_id, model_name, fold["fold"], fold["r2"], fold["mse"], fold["rmse"], fold["mae"])
+                for fold in folds]
+        get_database().insert_many("cv_results", ("run_id", "model_name", "fold", "r2", "mse", "rmse", "mae"), rows)
+
+    except Exception as e:
+        print(f"Error storing cross-validation results to DB: {e}")
+
 @task
-def load_processed_data(path: str) -> pd.DataFrame:
-    """Load processed data from a CSV file."""
-    return pd.read_csv(path)
+def load_processed_data(path: str, file_format: str = "csv", columns: list = None,
+                        compact: bool = False) -> pd.DataFrame:
+    """Load processed data (CSV, Parquet or Feather), optionally only the given columns and with compact dtypes."""
+    return read_processed_data(path, file_format, columns, compact)
+
+def search_best_model(X_train: pd.DataFrame, y_train: pd.Series, search_config: dict, random_state: int):
+    """
+    Run the parallel hyperparameter search on a validation split of the training data,
+    log every candidate as a nested MLflow run and return the best parameters refitted
+    on all of X_train.
+    """
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train, y_train, test_size=search_config.get("validation_size", 0.2), random_state=random_state
+    )
+    candidates = parameter_candidates(search_config, random_state)
+    print(f"Searching {len(candidates)} candidates...")
+    results = run_search(X_fit, y_fit, X_val, y_val, candidates, random_state, search_config.get("n_workers"))
+
+    # Highest validation score, the first candidate on ties
+    best = max(results, key=lambda result: result["val_score"])
+    for result in results:
+        with mlflow.start_run(run_name=f"candidate-{result['index']}", nested=True):
+            mlflow.log_params(result["params"])
+            mlflow.log_metric("train_score", result["train_score"])
+            mlflow.log_metric("val_score", result["val_score"])
+            mlflow.log_metric("fit_seconds", result["fit_seconds"])
+            mlflow.set_tag("best_candidate", str(result is best).lower())
+
+    mlflow.log_params(best["params"])
+    mlflow.log_metric("best_val_score", best["val_score"])
+    print(f"Best candidate: {best['params']} (validation score: {best['val_score']})")
+
+    # The candidates stay in the workers: refit the best parameters on the full training set,
+    # including the validation rows; fitting the DataFrame also records the training column names
+    model = RandomForestRegressor(random_state=random_state, **best["params"])
+    model.fit(X_train, y_train)
+    return model
+
+def load_previous_model():
+    """
+    Load the model of the latest training run from MLflow.
+
+    Returns:
+        tuple: (model, number of processed rows it was trained on, its feature transform or None,
+        its test row positions or None), or (None, 0, None, None) if there is none.
+    """
+    client = mlflow.tracking.MlflowClient()
+    runs = client.search_runs(
+        experiment_ids=["0"], filter_string="params.n_rows_trained != ''",
+        order_by=["start_time DESC"], max_results=1,
+    )
+    if not runs:
+        return None, 0, None, None
+    run = runs[0]
+    model = mlflow.sklearn.load_model(f"runs:/{run.info.run_id}/model")
+    print(f"Loaded previous model from run {run.info.run_id}")
+    return (model, int(run.data.params["n_rows_trained"]), load_run_transform(run.info.run_id),
+            load_test_rows(run.info.run_id))
+
+def load_test_rows(run_id: str):
+    """Load the test row positions logged by a training run, or None for runs that predate them."""
+    try:
+        return np.load(mlflow.artifacts.download_artifacts(run_id=run_id, artifact_path=TEST_ROWS_FILE))
+    except Exception:
+        return None
+
+def log_test_rows(test_rows: np.ndarray):
+    """Log the test row positions of the active run, so incremental runs keep them out of training."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, TEST_ROWS_FILE)
+        np.save(path, test_rows)
+        mlflow.log_artifact(path)
+
+def split_rows(n_rows: int, test_size: float, random_state: int, rows_trained: int = 0,
+               previous_test_rows: np.ndarray = None) -> tuple:
+    """
+    Split row positions into train and test sets that stay stable across incremental runs.
+
+    The first rows_trained rows keep the split of the previous run (previous_test_rows, or
+    the full-mode split of those rows for runs that didn't log theirs). Only rows appended
+    since are split anew and added to both sets, so a row the previous forest was trained
+    on never moves into the test set.
+
+    Returns:
+        tuple: (train row positions, test row positions).
+    """
+    rows = np.arange(n_rows)
+    if rows_trained <= 0 or rows_trained > n_rows:
+        return tuple(train_test_split(rows, test_size=test_size, random_state=random_state))
+
+    if previous_test_rows is None:
+        _, previous_test_rows = train_test_split(rows[:rows_trained], test_size=test_size, random_state=random_state)
+    is_test = np.zeros(n_rows, dtype=bool)
+    is_test[previous_test_rows] = True
+    new_rows = rows[rows_trained:]
+    # A single new row can't be split; it goes to the training set
+    if len(new_rows) >= 2:
+        _, new_test_rows = train_test_split(new_rows, test_size=test_size, random_state=random_state)
+        is_test[new_test_rows] = True
+    return rows[~is_test], rows[is_test]
+
+def build_features(transform: FeatureTransform, X: pd.DataFrame) -> pd.DataFrame:
+    """Apply the feature transform to processed rows, keeping the index and naming the feature columns."""
+    return pd.DataFrame(transform.transform_frame(X), index=X.index, columns=transform.feature_names)
+
+def new_feature_transform(model_config: dict, compact: bool, columns: list = None) -> FeatureTransform:
+    """
+    Unfitted feature transform of the model section of config.yaml: its "features"
+    (or all given columns) and "standardize_features", in float32 for compact data.
+    """
+    # Compact mode keeps float32 features (the dtype the trees are built on) from the file to sklearn
+    return FeatureTransform(model_config.get("features") or columns,
+                            standardize=model_config.get("standardize_features", False),
+                            dtype="float32" if compact else "float64")
+
+def prepare_training_sets(data: pd.DataFrame, transform: FeatureTransform, test_size: float, random_state: int,
+                          rows_trained: int = 0, previous_test_rows: np.ndarray = None) -> tuple:
+    """
+    Split processed rows into training and test sets and build their model features.
+
+    Rows of a previous run keep their side of the split (see split_rows). The
+    transform's standardization is learned on the training rows only, if it
+    isn't fitted yet.
+
+    Returns:
+        tuple: (X_train, X_test, y_train, y_test, test row positions).
+    """
+    X = data.drop("quality", axis=1)
+    y = data["quality"]
+    train_rows, test_rows = split_rows(len(X), test_size, random_state, rows_trained, previous_test_rows)
+    X_train, X_test = X.iloc[train_rows], X.iloc[test_rows]
+    y_train, y_test = y.iloc[train_rows], y.iloc[test_rows]
+
+    if transform.mean is None:
+        transform.fit(transform.input_matrix(X_train))
+    return build_features(transform, X_train), build_features(transform, X_test), y_train, y_test, test_rows
+
+def fit_forest(X_train: pd.DataFrame, y_train: pd.Series, n_estimators: int, random_state: int) -> RandomForestRegressor:
+    """Fit the RandomForest of a full training run."""
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state)
+    model.fit(X_train, y_train)
+    return model
+
+def grow_forest(model: RandomForestRegressor, X_new, y_new, n_new_estimators: int, max_estimators: int = None):
+    """
+    Add trees fitted on new data to a trained forest with warm_start, keeping the existing trees.
+
+    If max_estimators is set, the oldest trees are dropped so that the ensemble
+    keeps at most that many trees.
+
+    warm_start seeds the new trees with the draws that follow the first
+    len(estimators_) draws of random_state, so after trimming they would repeat
+    the seeds (bootstrap and feature draws) of trees still in the forest. Each
+    growth therefore reseeds from random_state and the number of trees fitted so
+    far (n_trees_fitted_, saved with the model).
+    """
+    trees_fitted = getattr(model, "n_trees_fitted_", len(model.estimators_))
+    random_state = model.random_state
+    if random_state is not None:
+        random_state = int(np.random.SeedSequence([random_state, trees_fitted]).generate_state(1)[0])
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_new_estimators,
+                     random_state=random_state)
+    model.fit(X_new, y_new)
+    model.n_trees_fitted_ = trees_fitted + n_new_estimators
+    if max_estimators and len(model.estimators_) > max_estimators:
+        model.estimators_ = model.estimators_[-max_estimators:]
+        model.set_params(n_estimators=max_estimators)
+    return model
+
+def cross_validate_model(model: RandomForestRegressor, X_train, y_train, cv_config: dict, random_state: int) -> list:
+    """
+    Cross-validate the model's parameters on the training data in parallel and log
+    per-fold (as steps) and aggregate metrics to MLflow.
+    """
+    folds = cross_validate_parallel(
+        X_train, y_train, model.get_params(), n_splits=cv_config.get("n_splits", 5),
+        random_state=random_state, n_workers=cv_config.get("n_workers"),
+    )
+    for fold in folds:
+        for metric in FOLD_METRICS:
+            mlflow.log_metric(f"cv_{metric}", fold[metric], step=fold["fold"])
+    summary = summarize_folds(folds)
+    for name, value in summary.items():
+        mlflow.log_metric(f"cv_{name}", value)
+    print(f"Cross-validation R²: {summary['r2_mean']:.4f} ± {summary['r2_std']:.4f}")
+    return folds
 
 @flow(name="Model Training Pipeline")
 def train_model_pipeline():
@@ -48,45 +254,123 @@ def train_model_pipeline():
     # Load configuration
     config = load_config("configs/config.yaml")
     data_path = config["data"]["processed_path"]
+    data_format = config["data"].get("processed_format", "csv")
+    features = config["model"].get("features")
     test_size = config["model"]["test_size"]
     random_state = config["model"]["random_state"]
     n_estimators = config["model"]["n_estimators"]
+    compact = config["data"].get("compact_dtypes", False)
 
     # Start MLflow run
     mlflow.set_tracking_uri(config["mlflow"]["tracking_uri"])
     with mlflow.start_run():
-        # Load data
-        data = load_processed_data(data_path)
+        # Incremental mode grows the previous forest instead of training from scratch
+        training_mode = config["model"].get("training_mode", "full")
+        previous_model, rows_trained, previous_transform, previous_test_rows = (
+            load_previous_model() if training_mode == "incremental" else (None, 0, None, None))
+
+        # The feature transform is saved with the model, so the API builds the same features.
+        # A grown forest keeps the transform of the trees it already has.
+        transform = None
+        if previous_model is not None:
+            transform = previous_transform or FeatureTransform.for_model(previous_model)
+        elif features:
+            transform = new_feature_transform(config["model"], compact)
+
+        # Load data (only the input columns the features need)
+        data = load_processed_data(data_path, data_format, transform.used_columns + ["quality"] if transform else None,
+                                   compact)
         
         # Assuming 'quality' is the target variable
         print(data.columns)  # Debugging
-        X = data.drop("quality", axis=1)
-        y = data["quality"]
+        if transform is None:
+            transform = new_feature_transform(config["model"], compact,
+                                              [column for column in data.columns if column != "quality"])
 
-        # Split data into training and test sets
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=test_size, random_state=random_state
-        )
+        # Split data into training and test sets and build their features
+        X_train, X_test, y_train, y_test, test_rows = prepare_training_sets(
+            data, transform, test_size, random_state, rows_trained, previous_test_rows)
+        log_test_rows(test_rows)
+        mlflow.log_dict(transform.to_dict(), TRANSFORM_FILE)
 
-        # Train RandomForest model
-        model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state)
-        model.fit(X_train, y_train)
+        search_config = config["model"].get("search", {})
+        with profile_stage("fit"):
+            if previous_model is not None:
+                incremental_config = config["model"].get("incremental", {})
+                if incremental_config.get("data", "new") == "new":
+                    # Only rows appended to the processed data since the previous training run
+                    is_new = X_train.index >= rows_trained
+                    X_fit, y_fit = X_train[is_new], y_train[is_new]
+                else:
+                    X_fit, y_fit = X_train, y_train
+                test_score_before = previous_model.score(X_test, y_test)
+                mlflow.log_metric("test_score_before", test_score_before)
+
+                if len(X_fit) == 0:
+                    print("No new training rows since the previous run; keeping the previous model.")
+                    model = previous_model
+                else:
+                    model = grow_forest(previous_model, X_fit, y_fit, incremental_config.get("n_new_estimators", 20),
+                                        incremental_config.get("max_estimators"))
+                mlflow.log_param("n_estimators", len(model.estimators_))
+                mlflow.log_param("n_rows_fitted", len(X_fit))
+                mlflow.log_metric("test_score_after", model.score(X_test, y_test))
+                print(f"Grew forest on {len(X_fit)} rows to {len(model.estimators_)} trees "
+                      f"(test score before: {test_score_before})")
+            elif search_config.get("enabled", False):
+                # Pick the best RandomForest from the configured search space
+                model = search_best_model(X_train, y_train, search_config, random_state)
+            else:
+                # Train RandomForest model
+                model = fit_forest(X_train, y_train, n_estimators, random_state)
+                mlflow.log_param("n_estimators", n_estimators)
+
+        # Estimate the generalization error of the chosen parameters with k-fold CV
+        cv_config = config["model"].get("cross_validation", {})
+        folds = []
+        if cv_config.get("enabled"):
+            with profile_stage("cross_validation"):
+                folds = cross_validate_model(model, X_train, y_train, cv_config, random_state)
 
         # Log parameters, metrics, and model in MLflow
-        mlflow.log_param("n_estimators", n_estimators)
-        train_score = model.score(X_train, y_train)
-        test_score = model.score(X_test, y_test)
+        mlflow.log_param("training_mode", "incremental" if previous_model is not None else "full")
+        mlflow.log_param("n_rows_trained", len(data))
+        with profile_stage("score"):
+            train_score = model.score(X_train, y_train)
+            # Test metrics in one pass; R² is what model.score reports
+            test_metrics = RegressionMetrics().update(y_test, model.predict(X_test)).result()
+        test_score = test_metrics["R²"]
         mlflow.log_metric("train_score", train_score)
         mlflow.log_metric("test_score", test_score)
-        mlflow.sklearn.log_model(model, "model")
+        with profile_stage("log_model"):
+            mlflow.sklearn.log_model(model, "model")
+        run_id = mlflow.active_run().info.run_id
+
+        registered_model_name = config["model"].get("registered_model_name")
+        if registered_model_name:
+            try:
+                mlflow.register_model(f"runs:/{run_id}/model", registered_model_name)
+            except Exception as e:
+                print(f"Error registering model: {e}")
+
+        # Export a flattened, memory-mappable copy of the model for fast API startup
+        with profile_stage("export_model"):
+            artifact_dir = export_model_artifact(model, config["model"]["export_dir"], run_id,
+                                                 transform.feature_names, transform)
+            mlflow.log_artifacts(artifact_dir, artifact_path="flat_model")
 
         print(f"Training complete. Train score: {train_score}, Test score: {test_score}")
 
         # Save results to database after training
-        store_model_results_to_db("RandomForestModel", train_score, test_score)
+        store_model_results_to_db("RandomForestModel", train_score, test_score, run_id=run_id,
+                                  hyperparameters=model.get_params(), metrics=test_metrics)
+        if folds:
+            store_cv_results_to_db(run_id, "RandomForestModel", folds)
 
-        # Evaluate the model and log the results
-        evaluate_model(model, X_test, y_test)  # Evaluieren und in MLflow loggen
+        # Evaluate the model and log the results; async plots are finished in the background
+        # (failures are printed, and pending plots complete before the process exits)
+        async_plots = config.get("evaluation", {}).get("async_plots", False)
+        evaluate_model(model, X_test, y_test, async_plots=async_plots)  # Evaluieren und in MLflow loggen
 
 if __name__ == "__main__":
     train_model_pipeline()
\ No newline at end of file
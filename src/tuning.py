@@ -0,0 +1,92 @@
+"""
+Hyperparameter Search Module.
+
+This module fits RandomForestRegressor candidates from a parameter grid or a
+random-search space in parallel worker processes. The training and validation
+arrays are placed in shared memory once and mapped by every worker.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+from src.shared_arrays import init_worker, release_arrays, share_arrays, worker_arrays
+
+
+def parameter_candidates(search_config: dict, random_state: int) -> List[dict]:
+    """
+    Expand the search configuration into a list of parameter sets.
+
+    Args:
+        search_config (dict): The model.search section of config.yaml. "method" is
+            "grid" (uses "param_grid") or "random" (samples "n_iter" sets from
+            "param_distributions").
+        random_state (int): Seed for random search.
+
+    Returns:
+        list: Parameter dictionaries for RandomForestRegressor.
+    """
+    method = search_config.get("method", "grid")
+    if method == "grid":
+        return list(ParameterGrid(search_config["param_grid"]))
+    if method == "random":
+        return list(ParameterSampler(search_config["param_distributions"], n_iter=search_config.get("n_iter", 10),
+                                     random_state=random_state))
+    raise ValueError(f"Unknown search method: {method}")
+
+
+def _fit_candidate(index: int, params: dict, random_state: int) -> dict:
+    """Fit one candidate on the shared arrays and score it (runs in a worker process)."""
+    arrays = worker_arrays()
+    start = time.perf_counter()
+    # One core per candidate; parallelism comes from the process pool
+    model = RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    model.fit(arrays["X_train"], arrays["y_train"])
+    fit_seconds = time.perf_counter() - start
+    return {
+        "index": index,
+        "params": params,
+        "train_score": model.score(arrays["X_train"], arrays["y_train"]),
+        "val_score": model.score(arrays["X_val"], arrays["y_val"]),
+        "fit_seconds": fit_seconds,
+    }
+
+
+def run_search(X_train, y_train, X_val, y_val, candidates: List[dict], random_state: int,
+               n_workers: Optional[int] = None) -> List[dict]:
+    """
+    Fit all candidates in a process pool and score them on the validation set.
+
+    The features are shared as a float32 matrix (the dtype the trees are built
+    on) and the targets as float64, so sklearn uses the shared buffers without
+    converting them in each worker. The fitted forests stay in the workers; only
+    the scores come back, so refit the chosen parameters.
+
+    Args:
+        X_train, y_train: Training features and target.
+        X_val, y_val: Validation features and target.
+        candidates (list): Parameter sets from parameter_candidates.
+        random_state (int): Seed passed to every candidate.
+        n_workers (int): Number of worker processes (None uses all cores).
+
+    Returns:
+        list: One result per candidate in candidate order, each with "index", "params",
+            "train_score", "val_score" and "fit_seconds".
+    """
+    specs, segments = share_arrays(
+        X_train=np.asarray(X_train, dtype=np.float32),
+        y_train=np.asarray(y_train, dtype=np.float64),
+        X_val=np.asarray(X_val, dtype=np.float32),
+        y_val=np.asarray(y_val, dtype=np.float64),
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(specs,)) as executor:
+            futures = [executor.submit(_fit_candidate, index, params, random_state)
+                       for index, params in enumerate(candidates)]
+            return [future.result() for future in futures]
+    finally:
+        release_arrays(segments)
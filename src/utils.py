@@ -2,6 +2,8 @@
 Utility functions for the wine_quality_pipeline.
 """
 
+import numpy as np
+import pandas as pd
 import yaml
 
 def load_config(path: str) -> dict:
@@ -16,4 +18,163 @@ def load_config(path: str) -> dict:
     """
     with open(path, "r") as file:
         config = yaml.safe_load(file)
-    return config
\ No newline at end of file
+    return config
+
+PROCESSED_FORMATS = ("csv", "parquet", "feather")
+
+# Compact schema: float32 measurements and these integer columns (the 0-10 quality grade)
+COMPACT_INTEGER_COLUMNS = {"quality": np.int8}
+
+def compact_dtypes(columns, nullable_integers: bool = False) -> dict:
+    """
+    dtypes of the given columns in the compact schema.
+    
+    Parameters:
+        columns (list): Column names.
+        nullable_integers (bool): Use pandas' nullable integer dtypes (e.g. "Int8"), which allow missing values.
+    
+    Returns:
+        dict: Column name to dtype.
+    """
+    dtypes = {}
+    for column in columns:
+        dtype = COMPACT_INTEGER_COLUMNS.get(column)
+        if dtype is None:
+            dtypes[column] = np.float32
+        else:
+            # "int8" -> "Int8"
+            dtypes[column] = np.dtype(dtype).name.capitalize() if nullable_integers else dtype
+    return dtypes
+
+def read_csv(path: str, compact: bool = False, **kwargs):
+    """
+    pd.read_csv, parsing straight into the compact schema if requested.
+    
+    Integer columns with missing values can't be parsed as NumPy integers; they
+    are read with nullable dtypes then (always for chunked reads, where a later
+    chunk may have them), which clean_data turns back into NumPy integers.
+    
+    Parameters:
+        path (str): CSV file path.
+        compact (bool): Parse with compact_dtypes instead of pandas' float64/int64 defaults.
+        **kwargs: Further pd.read_csv arguments (sep, usecols, chunksize, ...).
+    
+    Returns:
+        DataFrame, or a chunk iterator if chunksize is given.
+    """
+    if not compact:
+        return pd.read_csv(path, **kwargs)
+    columns = pd.read_csv(path, sep=kwargs.get("sep", ","), nrows=0).columns
+    if kwargs.get("chunksize") is not None:
+        return pd.read_csv(path, dtype=compact_dtypes(columns, nullable_integers=True), **kwargs)
+    try:
+        return pd.read_csv(path, dtype=compact_dtypes(columns), **kwargs)
+    except ValueError:
+        return pd.read_csv(path, dtype=compact_dtypes(columns, nullable_integers=True), **kwargs)
+
+def _to_float32(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast float64 columns to float32 for the columnar formats."""
+    float_columns = df.select_dtypes(include="float64").columns
+    if len(float_columns) == 0:
+        return df
+    return df.astype({column: np.float32 for column in float_columns})
+
+class ProcessedDataWriter:
+    """
+    Writes processed data in CSV, Parquet or Feather (Arrow IPC) format, one or more
+    DataFrame chunks at a time.
+    
+    The columnar formats store float columns as float32; Feather files are written
+    uncompressed so they can be memory-mapped and read without copying.
+    """
+
+    def __init__(self, path: str, file_format: str = "csv"):
+        """
+        Parameters:
+            path (str): Output file path.
+            file_format (str): One of "csv", "parquet" or "feather".
+        """
+        if file_format not in PROCESSED_FORMATS:
+            raise ValueError(f"Unsupported format '{file_format}', expected one of {PROCESSED_FORMATS}")
+        self.path = path
+        self.file_format = file_format
+        self.writer = None
+        self.schema = None
+        self.chunks_written = 0
+
+    def write(self, df: pd.DataFrame):
+        """Append a DataFrame chunk to the output file."""
+        if self.file_format == "csv":
+            first = self.chunks_written == 0
+            df.to_csv(self.path, mode="w" if first else "a", header=first, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(_to_float32(df), preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                if self.file_format == "parquet":
+                    self.writer = pq.ParquetWriter(self.path, self.schema)
+                else:
+                    self.writer = pa.ipc.new_file(self.path, self.schema)
+            self.writer.write_table(table.cast(self.schema))
+        self.chunks_written += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def write_processed_data(df: pd.DataFrame, path: str, file_format: str = "csv"):
+    """
+    Write a processed DataFrame in the configured format.
+    
+    Parameters:
+        df (DataFrame): The data to write.
+        path (str): Output file path.
+        file_format (str): One of "csv", "parquet" or "feather".
+    """
+    with ProcessedDataWriter(path, file_format) as writer:
+        writer.write(df)
+
+def read_processed_data(path: str, file_format: str = "csv", columns: list = None,
+                        compact: bool = False) -> pd.DataFrame:
+    """
+    Read processed data, loading only the requested columns.
+    
+    Parquet and Feather files are memory-mapped; uncompressed Feather columns are
+    handed to pandas without copying where possible.
+    
+    Parameters:
+        path (str): Input file path.
+        file_format (str): One of "csv", "parquet" or "feather".
+        columns (list): Columns to load (None loads all columns).
+        compact (bool): Return the compact schema (float32 features, int8 quality).
+    
+    Returns:
+        DataFrame: The processed data.
+    """
+    if file_format == "csv":
+        return read_csv(path, compact, usecols=columns)
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    elif file_format == "feather":
+        import pyarrow as pa
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    else:
+        raise ValueError(f"Unsupported format '{file_format}', expected one of {PROCESSED_FORMATS}")
+    df = table.to_pandas(split_blocks=True)
+    if compact:
+        # Only files written without the compact schema still have wider integer columns
+        df = df.astype(compact_dtypes(df.columns), copy=False)
+    return df
@@ -0,0 +1,131 @@
+"""
+Tests for the pooled Database class, run against a SQLite stand-in.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from alembic import command
+from alembic.config import Config
+from src.database import Database
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "results.db")
+        self.db = Database(connection_factory=lambda: sqlite3.connect(path, check_same_thread=False),
+                           paramstyle="qmark", max_connections=2)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_insert_many_creates_table_once(self):
+        rows = [(0.9, 0.5, "a"), (0.8, 0.4, "b")]
+        self.assertEqual(self.db.insert_many("model_results", ("accuracy", "loss", "model_name"), rows), 2)
+        self.db.insert_many("model_results", ("accuracy", "loss", "model_name"), [(0.7, 0.3, "c")])
+        self.assertEqual(self.db._ready_tables, {"model_results"})
+
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT model_name FROM model_results ORDER BY accuracy DESC")
+            self.assertEqual([row[0] for row in cursor.fetchall()], ["a", "b", "c"])
+
+    def test_transaction_rolls_back_on_error(self):
+        self.db.ensure_table("cv_results")
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction() as cursor:
+                cursor.execute("INSERT INTO cv_results (run_id, fold) VALUES (?, ?)", ("run", 0))
+                raise RuntimeError("fail")
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM cv_results")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_insert_many_quotes_identifiers(self):
+        with self.db.transaction() as cursor:
+            cursor.execute('CREATE TABLE "wine samples" ("fixed acidity" FLOAT, "say ""hi""" TEXT)')
+        self.db.insert_many("wine samples", ("fixed acidity", 'say "hi"'), [(7.4, "a"), (7.8, "b")])
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM "wine samples"')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_unmigrated_table_requires_upgrade(self):
+        with self.db.transaction() as cursor:
+            cursor.execute("CREATE TABLE model_results (id INTEGER PRIMARY KEY, accuracy FLOAT, loss FLOAT, "
+                           "model_name VARCHAR(255))")
+        with self.assertRaisesRegex(RuntimeError, "alembic upgrade head"):
+            self.db.insert_many("model_results", ("model_name",), [("forest",)])
+
+    def test_pool_is_shared_across_threads(self):
+        def write(index):
+            self.db.insert_many("cv_results", ("run_id", "fold"), [("run", index * 10 + fold) for fold in range(10)])
+
+        self.db.ensure_table("cv_results")
+        threads = [threading.Thread(target=write, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.db.connect()
+        self.assertEqual(self.db.fetch_all("SELECT COUNT(*) FROM cv_results WHERE run_id = %s", ("run",)), [(40,)])
+        self.assertLessEqual(len(self.db.pool._idle), 2)
+
+class TestModelResultsQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "results.db")
+        # Build the schema with the migrations rather than ensure_table
+        alembic_config = Config()
+        alembic_config.set_main_option("script_location", "alembic")
+        with mock.patch.dict(os.environ, {"DATABASE_URL": f"sqlite:///{path}"}):
+            command.upgrade(alembic_config, "head")
+        self.alembic_config, self.path = alembic_config, path
+        self.db = Database(connection_factory=lambda: sqlite3.connect(path), paramstyle="qmark")
+        columns = ("model_name", "run_id", "created_at", "r2", "rmse")
+        self.db.insert_many("model_results", columns, [
+            ("forest", "run-1", "2026-01-01 10:00:00", 0.40, 0.70),
+            ("forest", "run-2", "2026-01-02 10:00:00", 0.55, 0.62),
+            ("forest", "run-3", "2026-01-03 10:00:00", 0.50, 0.60),
+            ("linear", "run-4", "2026-01-04 10:00:00", 0.30, 0.80),
+        ])
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_best_and_latest_run(self):
+        self.assertEqual(self.db.best_run("r2")["run_id"], "run-2")
+        self.assertEqual(self.db.best_run("rmse", model_name="forest")["run_id"], "run-3")
+        self.assertEqual(self.db.latest_run()["run_id"], "run-4")
+        self.assertEqual(self.db.latest_run("forest")["run_id"], "run-3")
+        self.assertIsNone(self.db.best_run("r2", model_name="missing"))
+        with self.assertRaises(ValueError):
+            self.db.best_run("r2; DROP TABLE model_results")
+
+    def test_metric_over_time(self):
+        series = self.db.metric_over_time("r2", model_name="forest", since="2026-01-02 00:00:00")
+        self.assertEqual([(point["run_id"], point["value"]) for point in series], [("run-2", 0.55), ("run-3", 0.50)])
+        latest = self.db.metric_over_time("r2", limit=2)
+        self.assertEqual([point["run_id"] for point in latest], ["run-3", "run-4"])
+
+    def test_indexes_serve_model_lookups(self):
+        with self.db.transaction() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN SELECT * FROM model_results WHERE model_name = ? "
+                           "ORDER BY created_at DESC LIMIT 1", ("forest",))
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("ix_model_results_model_name_created_at", plan)
+
+    def test_downgrade_keeps_existing_results(self):
+        with mock.patch.dict(os.environ, {"DATABASE_URL": f"sqlite:///{self.path}"}):
+            command.downgrade(self.alembic_config, "base")
+        with self.db.transaction() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM model_results")
+            self.assertEqual(cursor.fetchone()[0], 4)
+
+if __name__ == "__main__":
+    unittest.main()
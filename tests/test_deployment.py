@@ -0,0 +1,404 @@
+"""
+Tests for the FastAPI prediction service.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from collections import OrderedDict
+from unittest import mock
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestRegressor
+import src.deployment as deployment
+from src.batching import MicroBatcher
+from src.database import Database
+from src.features import FeatureTransform
+from src.inference import export_model_artifact
+from src.model_loader import LoadedModel, ModelWatcher, load_model
+from src.prediction_cache import PredictionCache
+from src.prediction_logger import PredictionLogger
+
+WINES = [
+    {"fixed_acidity": 7.4, "volatile_acidity": 0.70, "citric_acid": 0.00, "residual_sugar": 1.9,
+     "chlorides": 0.076, "free_sulfur_dioxide": 11, "total_sulfur_dioxide": 34, "density": 0.9978,
+     "pH": 3.51, "sulphates": 0.56, "alcohol": 9.4},
+    {"fixed_acidity": 7.8, "volatile_acidity": 0.88, "citric_acid": 0.00, "residual_sugar": 2.6,
+     "chlorides": 0.098, "free_sulfur_dioxide": 25, "total_sulfur_dioxide": 67, "density": 0.9968,
+     "pH": 3.20, "sulphates": 0.68, "alcohol": 9.8},
+]
+
+def service_config(**deployment_config) -> dict:
+    """Service configuration with every optional feature off unless given."""
+    return {"mlflow": {"tracking_uri": "file:./mlruns"}, "model": {"export_dir": "models/wine_quality_forest"},
+            "deployment": {"inference_engine": "flat", "model_reload": {"enabled": False}, **deployment_config}}
+
+class TestPredictBatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X = data.drop("quality", axis=1)
+        cls.model = RandomForestRegressor(n_estimators=10, random_state=42).fit(X.values, data["quality"])
+
+    def setUp(self):
+        self.previous_model = deployment.get_active_model()
+        deployment.set_active_model(LoadedModel(self.model, "test-run", "manual"))
+        self.client = TestClient(deployment.app)
+
+    def tearDown(self):
+        deployment.set_active_model(self.previous_model)
+
+    def expected(self):
+        raw = np.array([[wine[field] for field in deployment.FEATURE_FIELDS] for wine in WINES])
+        ratio = raw[:, 0] / (raw[:, 1] + 1e-5)
+        return self.model.predict(np.column_stack([raw, ratio]))
+
+    def test_records_payload(self):
+        response = self.client.post("/predict/batch", json={"records": WINES})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 2)
+        np.testing.assert_allclose(response.json()["predicted_quality"], self.expected())
+
+    def test_columns_payload(self):
+        columns = {field: [wine[field] for wine in WINES] for field in deployment.FEATURE_FIELDS}
+        response = self.client.post("/predict/batch", json={"columns": columns})
+        self.assertEqual(response.status_code, 200)
+        np.testing.assert_allclose(response.json()["predicted_quality"], self.expected())
+
+    def test_invalid_payload(self):
+        response = self.client.post("/predict/batch", json={"records": WINES, "columns": {}})
+        self.assertEqual(response.status_code, 422)
+        response = self.client.post("/predict/batch", json={"columns": {"alcohol": [9.4]}})
+        self.assertEqual(response.status_code, 422)
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_rows_share_batches(self):
+        calls = []
+
+        def predict_fn(X, model):
+            calls.append(len(X))
+            return X.sum(axis=1)
+
+        async def run():
+            batcher = MicroBatcher(predict_fn, n_features=2, max_batch_size=4, max_wait_ms=50)
+            await batcher.start()
+            rows = [np.array([i, 1.0]) for i in range(10)]
+            results = await asyncio.gather(*(batcher.submit(row) for row in rows))
+            await batcher.stop()
+            return results, batcher.stats()
+
+        results, stats = asyncio.run(run())
+        self.assertEqual(results, [i + 1.0 for i in range(10)])
+        self.assertEqual(calls, [4, 4, 2])
+        self.assertEqual(stats["requests_total"], 10)
+        self.assertEqual(stats["batches_total"], 3)
+        self.assertEqual(stats["batch_size_counts"], {"2": 1, "4": 2})
+        self.assertIsNotNone(stats["latency_ms_p99"])
+
+    def test_rows_are_predicted_with_the_model_they_were_submitted_for(self):
+        calls = []
+
+        def predict_fn(X, model):
+            calls.append((model, len(X)))
+            return X[:, 0] * model
+
+        async def run():
+            batcher = MicroBatcher(predict_fn, n_features=1, max_batch_size=8, max_wait_ms=50)
+            await batcher.start()
+            # A reload between requests: the queued rows keep the model they captured
+            results = await asyncio.gather(*(batcher.submit(np.array([1.0]), model) for model in (1, 1, 2, 1)))
+            await batcher.stop()
+            return results
+
+        self.assertEqual(asyncio.run(run()), [1.0, 1.0, 2.0, 1.0])
+        self.assertEqual(calls, [(1, 3), (2, 1)])
+
+    def test_predict_endpoint_uses_batcher(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(
+            data.drop("quality", axis=1).values, data["quality"])
+        previous = deployment.get_active_model(), deployment.config
+        deployment.set_active_model(LoadedModel(model, "test-run", "manual"))
+        deployment.config = service_config(micro_batching={"enabled": True, "max_batch_size": 8, "max_wait_ms": 1})
+        try:
+            with TestClient(deployment.app) as client:
+                response = client.post("/predict", json=WINES[0])
+                stats = client.get("/predict/batching").json()
+        finally:
+            deployment.set_active_model(previous[0])
+            deployment.config = previous[1]
+
+        expected = model.predict(FeatureTransform().transform(deployment.build_input_row(deployment.WineData(**WINES[0]))[None, :]))[0]
+        self.assertAlmostEqual(response.json()["predicted_quality"], expected)
+        self.assertTrue(stats["enabled"])
+        self.assertEqual(stats["requests_total"], 1)
+
+class TestModelReload(unittest.TestCase):
+
+    def test_watcher_swaps_in_new_export(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X, y = data.drop("quality", axis=1), data["quality"]
+        with tempfile.TemporaryDirectory() as export_dir:
+            config = {"deployment": {"inference_engine": "flat"}, "model": {"export_dir": export_dir}}
+            export_model_artifact(RandomForestRegressor(n_estimators=3, random_state=0).fit(X, y), export_dir, "run-1")
+
+            swapped = []
+            current = LoadedModel(None, "run-1", "artifact")
+            watcher = ModelWatcher(config, lambda: current, swapped.append)
+            self.assertFalse(watcher.check_once())
+
+            export_model_artifact(RandomForestRegressor(n_estimators=4, random_state=0).fit(X, y), export_dir, "run-2")
+            self.assertTrue(watcher.check_once())
+            self.assertEqual(swapped[0].run_id, "run-2")
+            self.assertEqual(swapped[0].source, "artifact")
+            self.assertEqual(swapped[0].model.n_trees, 4)
+
+    def test_model_endpoint(self):
+        previous = deployment.get_active_model()
+        deployment.set_active_model(LoadedModel(object(), "run-42", "manual"))
+        try:
+            info = TestClient(deployment.app).get("/model").json()
+        finally:
+            deployment.set_active_model(previous)
+        self.assertEqual(info["run_id"], "run-42")
+        self.assertIn("loaded_at", info)
+
+class TestPredictionCache(unittest.TestCase):
+
+    def test_lru_eviction_and_quantization(self):
+        cache = PredictionCache(max_size=2, quantization=0.01)
+        cache.put(np.array([1.0, 2.0]), "v1", 5.0)
+        cache.put(np.array([3.0, 4.0]), "v1", 6.0)
+        self.assertEqual(cache.get(np.array([1.001, 2.0]), "v1"), 5.0)
+        cache.put(np.array([5.0, 6.0]), "v1", 7.0)  # evicts [3, 4]
+        self.assertIsNone(cache.get(np.array([3.0, 4.0]), "v1"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 1, 1))
+
+    def test_ttl_and_model_change(self):
+        cache = PredictionCache(ttl_seconds=0.01)
+        cache.put(np.array([1.0]), "v1", 5.0)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(np.array([1.0]), "v1"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+        cache = PredictionCache()
+        cache.put(np.array([1.0]), "v1", 5.0)
+        self.assertIsNone(cache.get(np.array([1.0]), "v2"))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_predict_endpoint_skips_model_on_hit(self):
+        class CountingModel:
+            calls = 0
+
+            def predict(self, X):
+                CountingModel.calls += 1
+                return np.full(len(X), 5.5)
+
+        previous = deployment.get_active_model(), deployment.prediction_cache
+        deployment.set_active_model(LoadedModel(CountingModel(), "test-run", "manual"))
+        deployment.prediction_cache = PredictionCache(max_size=10)
+        try:
+            client = TestClient(deployment.app)
+            responses = [client.post("/predict", json=WINES[0]).json() for _ in range(3)]
+            stats = client.get("/predict/cache").json()
+        finally:
+            deployment.set_active_model(previous[0])
+            deployment.prediction_cache = previous[1]
+
+        self.assertEqual(responses, [{"predicted_quality": 5.5}] * 3)
+        self.assertEqual(CountingModel.calls, 1)
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+class TestPredictionLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "logs.db")
+        self.database = Database(connection_factory=lambda: sqlite3.connect(path, check_same_thread=False),
+                                 paramstyle="qmark")
+
+    def tearDown(self):
+        self.database.close()
+        self.tmp.cleanup()
+
+    def count_rows(self):
+        with self.database.transaction() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM prediction_logs")
+            return cursor.fetchone()[0]
+
+    def test_full_queue_drops_and_stop_flushes(self):
+        logger = PredictionLogger(self.database, max_queue_size=5, batch_size=2)
+        # Not started yet, so nothing drains the queue
+        accepted = [logger.log("predict", "run", {"alcohol": 9.4}, 5.0, 1.0) for _ in range(7)]
+        self.assertEqual(accepted, [True] * 5 + [False] * 2)
+
+        logger.start()
+        logger.stop()
+        stats = logger.stats()
+        self.assertEqual((stats["written"], stats["dropped"], stats["batches"]), (5, 2, 3))
+        self.assertEqual(self.count_rows(), 5)
+
+    def test_batch_entry_is_expanded_by_the_writer(self):
+        logger = PredictionLogger(self.database, max_queue_size=1, batch_size=2)
+        X = np.array([[9.4, 0.7], [9.8, 0.88], [10.0, 0.5]])
+        self.assertTrue(logger.log_batch("batch", "run", ["alcohol", "volatile_acidity"], X, np.array([5.0, 6.0, 7.0]), 2.0))
+        self.assertFalse(logger.log("predict", "run", {"alcohol": 9.4}, 5.0, 1.0))
+
+        logger.start()
+        logger.stop()
+        stats = logger.stats()
+        self.assertEqual((stats["logged"], stats["written"], stats["dropped"], stats["batches"]), (3, 3, 1, 2))
+        with self.database.transaction() as cursor:
+            cursor.execute("SELECT features, predicted_quality FROM prediction_logs ORDER BY id")
+            rows = cursor.fetchall()
+        self.assertEqual([quality for _, quality in rows], [5.0, 6.0, 7.0])
+        self.assertEqual(json.loads(rows[1][0]), {"alcohol": 9.8, "volatile_acidity": 0.88})
+
+    def test_predict_endpoints_are_logged(self):
+        class ConstantModel:
+            def predict(self, X):
+                return np.full(len(X), 5.5)
+
+        previous = deployment.get_active_model(), deployment.prediction_logger
+        deployment.set_active_model(LoadedModel(ConstantModel(), "test-run", "manual"))
+        deployment.prediction_logger = PredictionLogger(self.database, batch_size=100, flush_interval_seconds=0.01)
+        deployment.prediction_logger.start()
+        try:
+            client = TestClient(deployment.app)
+            client.post("/predict", json=WINES[0])
+            client.post("/predict/batch", json={"records": WINES})
+            deployment.stop_prediction_logger()
+            self.assertIsNone(deployment.prediction_logger)
+        finally:
+            deployment.set_active_model(previous[0])
+            deployment.prediction_logger = previous[1]
+
+        with self.database.transaction() as cursor:
+            cursor.execute("SELECT endpoint, run_id, predicted_quality FROM prediction_logs ORDER BY id")
+            rows = cursor.fetchall()
+        self.assertEqual(sorted(rows), [("batch", "test-run", 5.5)] * 2 + [("predict", "test-run", 5.5)])
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def test_prediction_stages_are_timed(self):
+        class ConstantModel:
+            def predict(self, X):
+                return np.full(len(X), 5.5)
+
+        previous = deployment.get_active_model()
+        deployment.set_active_model(LoadedModel(ConstantModel(), "test-run", "manual"))
+        try:
+            client = TestClient(deployment.app)
+            before = deployment.stage_duration.count(endpoint="/predict", stage="predict")
+            batch_rows = deployment.predictions_total.value(endpoint="/predict/batch", source="model")
+            self.assertEqual(client.post("/predict", json=WINES[0]).status_code, 200)
+            self.assertEqual(client.post("/predict", json={"alcohol": "strong"}).status_code, 422)
+            client.post("/predict/batch", json={"records": WINES})
+            client.get("/no-such-page")
+            text = client.get("/metrics").text
+        finally:
+            deployment.set_active_model(previous)
+
+        for stage in ("validation", "features", "predict", "serialization"):
+            self.assertIn(f'prediction_stage_duration_seconds_count{{endpoint="/predict",stage="{stage}"}}', text)
+        self.assertEqual(deployment.stage_duration.count(endpoint="/predict", stage="predict"), before + 1)
+        self.assertIn('http_requests_total{method="POST",path="/predict",status="422"}', text)
+        self.assertIn('http_requests_total{method="GET",path="other",status="404"}', text)
+        self.assertEqual(deployment.predictions_total.value(endpoint="/predict/batch", source="model"), batch_rows + 2)
+        self.assertIn('http_request_duration_seconds_bucket{method="POST",path="/predict",le="+Inf"}', text)
+
+class TestLifespan(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = deployment.get_active_model(), deployment.config
+        deployment.set_active_model(None)
+
+    def tearDown(self):
+        deployment.set_active_model(self.previous[0])
+        deployment.config = self.previous[1]
+
+    def wait_until_ready(self, client):
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            response = client.get("/ready")
+            if response.status_code == 200:
+                return response.json()
+            time.sleep(0.05)
+        self.fail("Model did not become ready")
+
+    def test_health_and_ready_during_model_load(self):
+        release = threading.Event()
+
+        def slow_load(config):
+            release.wait(10)
+            return LoadedModel(object(), "run-7", "manual")
+
+        deployment.config = service_config()
+        with mock.patch.object(deployment, "load_latest_model", slow_load), TestClient(deployment.app) as client:
+            self.assertEqual(client.get("/health").json(), {"status": "ok"})
+            response = client.get("/ready")
+            self.assertEqual(response.status_code, 503)
+            self.assertTrue(response.json()["loading"])
+            self.assertEqual(client.post("/predict", json=WINES[0]).status_code, 503)
+            release.set()
+            self.assertEqual(self.wait_until_ready(client)["run_id"], "run-7")
+        self.assertIsNone(deployment.inference_executor)
+
+    def test_process_executor(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X = data.drop("quality", axis=1)
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, data["quality"])
+        with tempfile.TemporaryDirectory() as export_dir:
+            export_model_artifact(model, export_dir, "run-1", list(X.columns), FeatureTransform())
+            deployment.config = service_config(inference_executor={"type": "process", "max_workers": 2})
+            deployment.config["model"]["export_dir"] = export_dir
+            with TestClient(deployment.app) as client:
+                self.wait_until_ready(client)
+                # Every worker has the model loaded before the first request
+                self.assertEqual(self.worker_states(), {"run-1"})
+                single = client.post("/predict", json=WINES[0]).json()["predicted_quality"]
+                batch = client.post("/predict/batch", json={"records": WINES}).json()["predicted_quality"]
+
+                # A reload is served by a new pool only once all its workers have loaded the new model
+                export_model_artifact(model, export_dir, "run-2", list(X.columns), FeatureTransform())
+                previous_executor = deployment.inference_executor
+                deployment.set_active_model(load_model(deployment.config, "run-2"))
+                self.assertIsNot(deployment.inference_executor, previous_executor)
+                self.assertEqual(self.worker_states(), {"run-2"})
+                self.assertEqual(client.get("/model").json()["run_id"], "run-2")
+
+        expected = model.predict(FeatureTransform().transform_frame(pd.DataFrame(WINES)))
+        self.assertAlmostEqual(single, expected[0])
+        np.testing.assert_allclose(batch, expected)
+
+    def worker_states(self) -> set:
+        """Run ids loaded by the inference workers, after checking that both workers answered."""
+        states = [deployment.inference_executor.submit(deployment._worker_state).result(timeout=60) for _ in range(8)]
+        pids = {pid for pid, _ in states}
+        self.assertLessEqual(len(pids), 2)
+        return {run_id for _, run_ids in states for run_id in run_ids}
+
+    def test_worker_keeps_previous_model_for_in_flight_requests(self):
+        loads = []
+
+        def fake_load(config, run_id):
+            loads.append(run_id)
+            return LoadedModel(object(), run_id, "artifact")
+
+        with mock.patch.object(deployment, "load_model", fake_load), \
+                mock.patch.object(deployment, "_worker_models", OrderedDict()):
+            for run_id in ("run-1", "run-2", "run-1", "run-2", "run-3", "run-1"):
+                deployment._worker_model(run_id)
+        self.assertEqual(loads, ["run-1", "run-2", "run-3", "run-1"])
+
+if __name__ == "__main__":
+    unittest.main()
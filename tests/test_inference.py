@@ -0,0 +1,116 @@
+"""
+Tests for the flattened tree ensemble and its model artifact.
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+import src.inference as inference
+from src.batch_scoring import score_file
+from src.data_preprocessing import add_engineered_features
+from src.features import FeatureTransform
+from src.inference import FlatForest, export_model_artifact, load_model_artifact
+from src.model_loader import load_model
+
+class TestFlatForest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        cls.X = data.drop("quality", axis=1)
+        cls.model = RandomForestRegressor(n_estimators=20, random_state=42).fit(cls.X, data["quality"])
+
+    def test_predictions_match_sklearn(self):
+        forest = FlatForest.from_sklearn(self.model)
+        self.assertEqual(forest.n_trees, 20)
+        self.assertEqual(forest.feature_names, list(self.X.columns))
+        np.testing.assert_array_equal(forest.predict(self.X.values), self.model.predict(self.X))
+
+    def test_blocked_traversal_matches_sklearn(self):
+        forest = FlatForest.from_sklearn(self.model)
+        previous = inference.MAX_LANES
+        inference.MAX_LANES = 20 * 7  # 7 rows per block
+        try:
+            np.testing.assert_array_equal(forest.predict(self.X.values[:100]), self.model.predict(self.X[:100]))
+        finally:
+            inference.MAX_LANES = previous
+
+    def test_export_and_memory_mapped_load(self):
+        with tempfile.TemporaryDirectory() as export_dir:
+            self.assertIsNone(load_model_artifact(export_dir))
+            artifact_dir = export_model_artifact(self.model, export_dir, "run-1", list(self.X.columns))
+            self.assertTrue(os.path.exists(os.path.join(artifact_dir, "meta.json")))
+
+            forest = load_model_artifact(export_dir)
+            self.assertEqual(forest.run_id, "run-1")
+            self.assertIsInstance(forest.threshold, np.memmap)
+            np.testing.assert_array_equal(forest.predict(self.X.values[:50]), self.model.predict(self.X[:50]))
+
+    def test_missing_values_follow_sklearn(self):
+        X = self.X.values[:200].copy()
+        rng = np.random.default_rng(0)
+        X[rng.random(X.shape) < 0.2] = np.nan
+        X[0] = np.nan
+        with tempfile.TemporaryDirectory() as export_dir:
+            export_model_artifact(self.model, export_dir, "run-1")
+            for forest in (FlatForest.from_sklearn(self.model), load_model_artifact(export_dir)):
+                np.testing.assert_array_equal(forest.predict(X), self.model.predict(X))
+
+class TestFeatureTransform(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.raw = pd.read_csv("data/raw/winequality-red.csv").drop("quality", axis=1)
+
+    def test_matches_feature_engineering(self):
+        transform = FeatureTransform()
+        expected = add_engineered_features(self.raw.copy())[transform.feature_names].to_numpy()
+        np.testing.assert_array_equal(transform.transform(self.raw.to_numpy()), expected)
+        # API field names map onto the dataset columns
+        renamed = self.raw.rename(columns=lambda column: column.replace(" ", "_"))
+        np.testing.assert_array_equal(transform.transform_frame(renamed), expected)
+
+    def test_standardized_subset_is_saved_with_the_model(self):
+        transform = FeatureTransform(["alcohol", "acidity_ratio"], standardize=True)
+        self.assertEqual(transform.used_columns, ["fixed acidity", "volatile acidity", "alcohol"])
+        features = transform.fit(self.raw.to_numpy()).transform(self.raw.to_numpy())
+        np.testing.assert_allclose(features.mean(axis=0), 0.0, atol=1e-9)
+        np.testing.assert_allclose(features.std(axis=0), 1.0)
+
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(features, np.arange(len(features)) % 6)
+        with tempfile.TemporaryDirectory() as export_dir:
+            export_model_artifact(model, export_dir, "run-1", transform.feature_names, transform)
+            config = {"deployment": {"inference_engine": "flat"}, "model": {"export_dir": export_dir}}
+            loaded = load_model(config, "run-1")
+        np.testing.assert_array_equal(loaded.transform.scale, transform.scale)
+        np.testing.assert_array_equal(loaded.model.predict(loaded.transform.transform_frame(self.raw)),
+                                      model.predict(features))
+
+class TestBatchScoring(unittest.TestCase):
+
+    def test_sharded_scoring_matches_model(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X = data.drop("quality", axis=1)
+        model = RandomForestRegressor(n_estimators=10, random_state=42).fit(X, data["quality"])
+        raw = pd.read_csv("data/raw/winequality-red.csv").head(500)
+        with tempfile.TemporaryDirectory() as tmp:
+            export_dir = os.path.join(tmp, "models")
+            export_model_artifact(model, export_dir, "run-1", list(X.columns))
+            config = {"deployment": {"inference_engine": "flat"}, "model": {"export_dir": export_dir},
+                      "mlflow": {"tracking_uri": f"file://{tmp}/mlruns"}}
+            input_path = os.path.join(tmp, "input.parquet")
+            raw.to_parquet(input_path, index=False)
+            output_path = os.path.join(tmp, "predictions.csv")
+
+            summary = score_file(input_path, output_path, config, chunksize=64, n_workers=2, max_in_flight=2)
+            self.assertEqual(summary["run_id"], "run-1")
+            self.assertEqual((summary["rows"], summary["chunks"]), (500, 8))
+
+            expected = model.predict(X.head(500))
+            np.testing.assert_allclose(pd.read_csv(output_path)["predicted_quality"], expected)
+
+if __name__ == "__main__":
+    unittest.main()
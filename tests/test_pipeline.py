@@ -2,10 +2,21 @@
 Unit and integration tests for the wine_quality_pipeline.
 """
 
+import filecmp
+import os
+import tempfile
+import time
 import unittest
+from unittest import mock
+import mlflow
+import numpy as np
 import pandas as pd
-from src.data_preprocessing import clean_data, feature_engineering
-from src.utils import load_config
+from prefect import flow
+from src.data_preprocessing import (cached_process_data, clean_data, feature_engineering, load_data,
+                                    process_partitions, save_data, split_partitions, stream_process_data)
+from src.profiling import PROFILE_ENV, RSS_SAMPLE_INTERVAL, profile_stage
+from src.stage_cache import StageCache
+from src.utils import load_config, ProcessedDataWriter, read_processed_data, write_processed_data
 
 class TestDataProcessing(unittest.TestCase):
 
@@ -38,6 +49,168 @@ class TestDataProcessing(unittest.TestCase):
         df_fe = feature_engineering.run(self.df)
         self.assertIn("acidity_ratio", df_fe.columns)
 
+class TestStreamingProcessing(unittest.TestCase):
+
+    def test_streaming_matches_in_memory(self):
+        @flow
+        def process_both(raw_path, in_memory_path, streamed_path):
+            save_data(feature_engineering(clean_data(load_data(raw_path))), in_memory_path)
+            return stream_process_data(raw_path, streamed_path, chunksize=100)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_memory_path = os.path.join(tmp_dir, "in_memory.csv")
+            streamed_path = os.path.join(tmp_dir, "streamed.csv")
+            rows = process_both("data/raw/winequality-red.csv", in_memory_path, streamed_path)
+            self.assertEqual(rows, len(pd.read_csv(in_memory_path)))
+            self.assertTrue(filecmp.cmp(in_memory_path, streamed_path, shallow=False))
+
+class TestPartitionedProcessing(unittest.TestCase):
+
+    def test_partitions_match_in_memory(self):
+        @flow
+        def process_both(raw_path):
+            df = load_data(raw_path)
+            partitions = split_partitions(df, 5)
+            return feature_engineering(clean_data(df.copy())), process_partitions(partitions), partitions
+
+        expected, merged, partitions = process_both("data/raw/winequality-red.csv")
+        self.assertEqual(len(partitions), 5)
+        self.assertEqual(sum(len(partition) for partition in partitions), len(expected))
+        pd.testing.assert_frame_equal(merged, expected)
+
+class TestCompactDtypes(unittest.TestCase):
+
+    def test_compact_layout_is_preserved(self):
+        @flow
+        def process(raw_path, processed_path, streamed_path):
+            df = feature_engineering(clean_data(load_data(raw_path, compact=True)))
+            save_data(df, processed_path, "parquet")
+            stream_process_data(raw_path, streamed_path, chunksize=2, file_format="parquet", compact=True)
+            return df
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            raw_path = os.path.join(tmp_dir, "raw.csv")
+            raw = pd.read_csv("data/raw/winequality-red.csv").head(5)
+            raw.loc[2, "quality"] = np.nan  # a missing grade is read as nullable Int8 and dropped by clean_data
+            raw.to_csv(raw_path, sep=";", index=False)
+            df = process(raw_path, os.path.join(tmp_dir, "processed.parquet"), os.path.join(tmp_dir, "streamed.parquet"))
+
+            expected = {column: np.float32 for column in df.columns if column != "quality"}
+            expected["quality"] = np.int8
+            self.assertEqual(len(df), 4)
+            self.assertEqual(df.dtypes.to_dict(), expected)
+            for name in ("processed", "streamed"):
+                stored = read_processed_data(os.path.join(tmp_dir, f"{name}.parquet"), "parquet")
+                self.assertEqual(stored.dtypes.to_dict(), expected)
+            csv_path = os.path.join(tmp_dir, "processed.csv")
+            write_processed_data(df, csv_path)
+            pd.testing.assert_frame_equal(read_processed_data(csv_path, compact=True), df)
+
+class TestStageCache(unittest.TestCase):
+
+    def test_cached_and_incremental_runs(self):
+        @flow
+        def process(raw_path, cache_dir):
+            cache = StageCache(cache_dir)
+            return cached_process_data(raw_path, cache), cache.read_manifest(raw_path)["last_run"]
+
+        with open("data/raw/winequality-red.csv", "r") as file:
+            lines = file.readlines()
+        expected = pd.read_csv("data/processed/processed_winequality.csv")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            raw_path = os.path.join(tmp_dir, "raw.csv")
+            cache_dir = os.path.join(tmp_dir, "cache")
+            with open(raw_path, "w") as file:
+                file.writelines(lines[:1001])
+
+            df, run_mode = process(raw_path, cache_dir)
+            self.assertEqual((len(df), run_mode), (1000, "full"))
+            df, run_mode = process(raw_path, cache_dir)
+            self.assertEqual((len(df), run_mode), (1000, "cached"))
+
+            with open(raw_path, "a") as file:
+                file.writelines(lines[1001:])
+            df, run_mode = process(raw_path, cache_dir)
+            self.assertEqual(run_mode, "incremental")
+            pd.testing.assert_frame_equal(df, expected)
+
+class TestProcessedDataFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.df = pd.read_csv("data/processed/processed_winequality.csv")
+
+    def test_columnar_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for file_format in ("parquet", "feather"):
+                path = os.path.join(tmp_dir, f"processed.{file_format}")
+                write_processed_data(self.df, path, file_format)
+
+                loaded = read_processed_data(path, file_format)
+                self.assertEqual(list(loaded.columns), list(self.df.columns))
+                self.assertEqual(loaded["alcohol"].dtype, np.float32)
+                self.assertEqual(loaded["quality"].dtype, self.df["quality"].dtype)
+                np.testing.assert_allclose(loaded["alcohol"], self.df["alcohol"], rtol=1e-6)
+
+                projected = read_processed_data(path, file_format, columns=["alcohol", "quality"])
+                self.assertEqual(list(projected.columns), ["alcohol", "quality"])
+
+    def test_chunked_writer(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "processed.parquet")
+            with ProcessedDataWriter(path, "parquet") as writer:
+                for start in range(0, len(self.df), 500):
+                    writer.write(self.df.iloc[start:start + 500])
+            self.assertEqual(len(read_processed_data(path, "parquet")), len(self.df))
+
+class TestProfiling(unittest.TestCase):
+
+    def test_stage_metrics_and_profile_dumps(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tracking_uri = mlflow.get_tracking_uri()
+            mlflow.set_tracking_uri(f"file:{tmp}/mlruns")
+            try:
+                with mlflow.start_run() as run, mock.patch.dict(os.environ, {PROFILE_ENV: os.path.join(tmp, "prof")}):
+                    with profile_stage("outer") as record:
+                        with profile_stage("inner"):
+                            sum(i * i for i in range(100000))
+                logged = mlflow.get_run(run.info.run_id).data.metrics
+            finally:
+                mlflow.set_tracking_uri(tracking_uri)
+            dumps = os.listdir(os.path.join(tmp, "prof"))
+
+        self.assertGreater(record["wall_seconds"], 0)
+        self.assertGreater(record["peak_rss_mb"], 0)
+        for stage in ("outer", "inner"):
+            self.assertIn(f"{stage}_wall_seconds", logged)
+            self.assertIn(f"{stage}_cpu_seconds", logged)
+        # Only the outermost stage is run under cProfile
+        self.assertEqual(len(dumps), 1)
+        self.assertTrue(dumps[0].startswith("outer-"))
+
+    def test_peak_rss_is_sampled_per_stage(self):
+        with profile_stage("allocate") as allocate:
+            block = np.ones(64 * 1024 * 1024 // 8)
+            time.sleep(4 * RSS_SAMPLE_INTERVAL)
+            del block
+        with profile_stage("idle") as idle:
+            pass
+        if idle["peak_rss_mb"] is None:
+            self.skipTest("resident memory is not readable on this platform")
+        # The later stage doesn't inherit the earlier one's peak, unlike the process high-water mark
+        self.assertLess(idle["peak_rss_mb"], allocate["peak_rss_mb"] - 32)
+        self.assertGreaterEqual(idle["max_rss_mb"], allocate["peak_rss_mb"] - 1)
+
+    def test_streamed_chunks_are_not_profiled_individually(self):
+        @flow
+        def stream(raw_path, streamed_path):
+            return stream_process_data(raw_path, streamed_path, chunksize=100)
+
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch("src.profiling.log_stage") as log_stage:
+            stream("data/raw/winequality-red.csv", os.path.join(tmp_dir, "streamed.csv"))
+        stages = [call.args[0]["stage"] for call in log_stage.call_args_list]
+        self.assertEqual(stages, ["stream_process_data"])
+
 class TestConfigLoader(unittest.TestCase):
     def test_load_config(self):
         # Assuming the config file exists in the correct location
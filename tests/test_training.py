@@ -0,0 +1,197 @@
+"""
+Tests for the training helpers.
+"""
+
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+import os
+import tempfile
+import mlflow
+import mlflow.sklearn
+from src.cross_validation import cross_validate_parallel, summarize_folds
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from src.evaluation import _report_plot_failure, evaluate_model, wait_for_plots
+from src.metrics import RegressionMetrics
+from src.features import TRANSFORM_FILE, FeatureTransform
+from src.train import grow_forest, load_previous_model, log_test_rows, search_best_model, split_rows
+from src.tuning import parameter_candidates, run_search
+
+class TestHyperparameterSearch(unittest.TestCase):
+
+    def setUp(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X, y = data.drop("quality", axis=1), data["quality"]
+        self.X_train, self.X_val, self.y_train, self.y_val = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    def test_parameter_candidates(self):
+        grid = parameter_candidates({"method": "grid", "param_grid": {"n_estimators": [5, 10], "max_depth": [3, None]}}, 42)
+        self.assertEqual(len(grid), 4)
+        sampled = parameter_candidates({"method": "random", "n_iter": 3,
+                                        "param_distributions": {"n_estimators": [5, 10, 20]}}, 42)
+        self.assertEqual(len(sampled), 3)
+        with self.assertRaises(ValueError):
+            parameter_candidates({"method": "bayes"}, 42)
+
+    def test_run_search_matches_serial_fit(self):
+        candidates = [{"n_estimators": 5, "max_depth": 2}, {"n_estimators": 5, "max_depth": None}]
+        results = run_search(self.X_train, self.y_train, self.X_val, self.y_val, candidates, 42, n_workers=2)
+
+        self.assertEqual([result["params"] for result in results], candidates)
+        self.assertEqual([result["index"] for result in results], [0, 1])
+        self.assertTrue(all("model" not in result for result in results))
+
+        for result in results:
+            serial = RandomForestRegressor(random_state=42, **result["params"]).fit(self.X_train.values, self.y_train)
+            self.assertAlmostEqual(result["val_score"], serial.score(self.X_val.values, self.y_val))
+
+    def test_search_best_model_refits_on_all_training_rows(self):
+        search_config = {"method": "grid", "param_grid": {"n_estimators": [5], "max_depth": [2, 4]}, "n_workers": 2}
+        with tempfile.TemporaryDirectory() as tmp:
+            tracking_uri = mlflow.get_tracking_uri()
+            mlflow.set_tracking_uri(f"file:{tmp}/mlruns")
+            try:
+                with mlflow.start_run():
+                    model = search_best_model(self.X_train, self.y_train, search_config, 42)
+            finally:
+                mlflow.set_tracking_uri(tracking_uri)
+
+        self.assertEqual(list(model.feature_names_in_), list(self.X_train.columns))
+        self.assertEqual(model.estimators_[0].tree_.weighted_n_node_samples[0], len(self.X_train))
+
+class TestIncrementalTraining(unittest.TestCase):
+
+    def test_grow_forest_keeps_old_trees_and_bounds_size(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X, y = data.drop("quality", axis=1), data["quality"]
+        model = RandomForestRegressor(n_estimators=5, random_state=42).fit(X[:1000], y[:1000])
+        old_trees = list(model.estimators_)
+
+        grow_forest(model, X[1000:], y[1000:], n_new_estimators=3)
+        self.assertEqual(len(model.estimators_), 8)
+        self.assertEqual(model.estimators_[:5], old_trees)
+
+        grow_forest(model, X[1000:], y[1000:], n_new_estimators=2, max_estimators=6)
+        self.assertEqual(len(model.estimators_), 6)
+        self.assertEqual(model.n_estimators, 6)
+        self.assertNotIn(old_trees[0], model.estimators_)
+        self.assertEqual(len(model.predict(X[:10])), 10)
+
+    def test_new_trees_get_new_seeds_after_trimming(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X, y = data.drop("quality", axis=1), data["quality"]
+        model = RandomForestRegressor(n_estimators=5, random_state=42).fit(X[:1000], y[:1000])
+        seeds = [tree.random_state for tree in model.estimators_]
+        for _ in range(3):
+            grow_forest(model, X[1000:], y[1000:], n_new_estimators=3, max_estimators=6)
+            seeds += [tree.random_state for tree in model.estimators_[-3:]]
+        self.assertEqual(len(set(seeds)), len(seeds))
+        self.assertEqual(model.n_trees_fitted_, 14)
+
+    def test_load_previous_model_from_file_store(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X, y = data.drop("quality", axis=1), data["quality"]
+        model = RandomForestRegressor(n_estimators=3, random_state=42).fit(X, y)
+        transform = FeatureTransform(list(X.columns), standardize=True).fit(X[FeatureTransform().input_columns])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tracking_uri = mlflow.get_tracking_uri()
+            mlflow.set_tracking_uri(f"file:{tmp}/mlruns")
+            try:
+                self.assertEqual(load_previous_model(), (None, 0, None, None))
+                with mlflow.start_run():
+                    mlflow.log_param("n_rows_trained", len(data))
+                    mlflow.log_dict(transform.to_dict(), TRANSFORM_FILE)
+                    mlflow.sklearn.log_model(model, "model")
+                    log_test_rows(np.array([3, 1, 4]))
+                previous_model, rows_trained, previous_transform, test_rows = load_previous_model()
+            finally:
+                mlflow.set_tracking_uri(tracking_uri)
+
+        self.assertEqual(rows_trained, len(data))
+        np.testing.assert_array_equal(previous_model.predict(X[:10]), model.predict(X[:10]))
+        self.assertEqual(previous_transform.feature_names, list(X.columns))
+        np.testing.assert_array_equal(previous_transform.mean, transform.mean)
+        np.testing.assert_array_equal(test_rows, [3, 1, 4])
+
+    def test_split_keeps_previous_training_rows_out_of_test_set(self):
+        old_train, old_test = split_rows(1000, 0.2, 42)
+        for previous_test_rows in (old_test, None):
+            train, test = split_rows(1300, 0.2, 42, rows_trained=1000, previous_test_rows=previous_test_rows)
+            self.assertEqual(len(np.intersect1d(old_train, test)), 0)
+            self.assertTrue(np.isin(old_test, test).all())
+            self.assertEqual(len(train) + len(test), 1300)
+            self.assertGreater((test >= 1000).sum(), 0)
+
+class TestCrossValidation(unittest.TestCase):
+
+    def test_parallel_folds_are_reproducible(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X, y = data.drop("quality", axis=1), data["quality"]
+        params = {"n_estimators": 5, "random_state": 42}
+
+        folds = cross_validate_parallel(X, y, params, n_splits=3, random_state=42, n_workers=2)
+        self.assertEqual([fold["fold"] for fold in folds], [0, 1, 2])
+        self.assertEqual(sum(fold["n_test"] for fold in folds), len(y))
+        repeated = cross_validate_parallel(X, y, params, n_splits=3, random_state=42, n_workers=3)
+        self.assertEqual([fold["r2"] for fold in folds], [fold["r2"] for fold in repeated])
+
+        summary = summarize_folds(folds)
+        self.assertAlmostEqual(summary["r2_mean"], np.mean([fold["r2"] for fold in folds]))
+
+class TestRegressionMetrics(unittest.TestCase):
+
+    def test_chunked_metrics_match_sklearn(self):
+        rng = np.random.default_rng(0)
+        y = rng.integers(3, 9, 5000).astype(float)
+        predictions = y + rng.normal(0, 0.7, len(y))
+
+        chunked = RegressionMetrics()
+        for start in range(0, len(y), 777):
+            chunked.update(y[start:start + 777], predictions[start:start + 777])
+        merged = RegressionMetrics().update(y[:2500], predictions[:2500]).merge(
+            RegressionMetrics().update(y[2500:], predictions[2500:]))
+
+        for metrics in (chunked.result(), merged.result()):
+            self.assertAlmostEqual(metrics["MSE"], mean_squared_error(y, predictions))
+            self.assertAlmostEqual(metrics["MAE"], mean_absolute_error(y, predictions))
+            self.assertAlmostEqual(metrics["R²"], r2_score(y, predictions))
+            self.assertAlmostEqual(metrics["residual_p50"], np.median(y - predictions), places=2)
+            self.assertEqual(sum(c["n"] for c in metrics["per_class"].values()), len(y))
+            self.assertAlmostEqual(metrics["per_class"][5]["MAE"], np.abs(y - predictions)[y == 5].mean())
+
+class TestAsyncEvaluation(unittest.TestCase):
+
+    def test_async_plots_are_logged_after_return(self):
+        data = pd.read_csv("data/processed/processed_winequality.csv")
+        X, y = data.drop("quality", axis=1), data["quality"]
+        model = RandomForestRegressor(n_estimators=5, random_state=42).fit(X[:1000], y[:1000])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tracking_uri = mlflow.get_tracking_uri()
+            mlflow.set_tracking_uri(f"file:{tmp}/mlruns")
+            try:
+                future = evaluate_model(model, X[1000:1200], y[1000:1200], async_plots=True,
+                                        plot_dir=os.path.join(tmp, "plots"))
+                run_id = mlflow.last_active_run().info.run_id
+                self.assertIn("R²", mlflow.get_run(run_id).data.metrics)
+                future.result(timeout=120)
+                wait_for_plots()
+                artifacts = {a.path for a in mlflow.tracking.MlflowClient().list_artifacts(run_id)}
+            finally:
+                mlflow.set_tracking_uri(tracking_uri)
+        self.assertEqual(artifacts, {"actual_vs_predicted.png", "residual_distribution.png", "feature_importance.png"})
+
+    def test_failed_render_is_reported(self):
+        future = Future()
+        with mock.patch("builtins.print") as printed:
+            future.add_done_callback(_report_plot_failure)
+            future.set_exception(ValueError("no display"))
+        printed.assert_called_once_with("Error rendering evaluation plots: no display")
+
+if __name__ == "__main__":
+    unittest.main()